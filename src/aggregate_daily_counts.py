@@ -6,16 +6,13 @@ Usage:
 """
 
 import sys
-import os
-import pandas as pd
 
-OUTPUT_PATH = "data/daily_counts.csv"
+from table_io import read_table, write_table
 
+OUTPUT_PATH = "data/daily_counts.parquet"
 
-def main(csv_path):
 
-    # Load barangay-assigned sightings
-    df = pd.read_csv(csv_path)
+def main(csv_path):
 
     required_cols = [
         "date",
@@ -23,19 +20,15 @@ def main(csv_path):
         "barangay_psgc"
     ]
 
-    for col in required_cols:
-        if col not in df.columns:
-            raise ValueError(f"Missing required column: {col}")
-
-    # Ensure date is datetime
-    df["date"] = pd.to_datetime(df["date"])
+    # Load barangay-assigned sightings (typed; only the needed columns)
+    df = read_table(csv_path, columns=required_cols)
 
     # -----------------------------------------
     # Aggregate daily counts
     # -----------------------------------------
     daily_counts = (
         df
-        .groupby(["barangay_psgc", "species", "date"])
+        .groupby(["barangay_psgc", "species", "date"], observed=True)
         .size()
         .reset_index(name="count")
     )
@@ -46,8 +39,7 @@ def main(csv_path):
     )
 
     # Save output
-    os.makedirs("data", exist_ok=True)
-    daily_counts.to_csv(OUTPUT_PATH, index=False)
+    write_table(daily_counts, OUTPUT_PATH)
 
     print(f"Success. File saved to: {OUTPUT_PATH}")
 
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+
+"""
+Usage:
+    python aggregate_grid.py barangay_sightings.csv [--sparse]
+
+aggregate_daily_counts.py and build_time_grid.py in one pass: every
+sighting is mapped to integer grid coordinates
+
+    cell = (barangay * n_species + species) * n_days + day
+
+and counted with np.bincount (dense) or np.unique (sparse COO), with
+no intermediate daily-count table and no Cartesian-product merge. The
+output has the same rows and counts as the grid build_time_grid.py
+writes, sorted by (barangay, species, date); build_time_grid.py keeps
+species in order of first appearance, so row order can differ.
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+
+from build_time_grid import END_DATE, OUTPUT_PATH, START_DATE
+from sparse_grid import SPARSE_COLUMNS, grid_dates, write_sparse_grid
+from table_io import read_table, write_table
+
+
+def grid_coordinates(df, dates):
+    """(barangays, species, flat cell index per sighting) of `df`.
+
+    Barangays and species are the sorted unique values, as in the grid
+    built from the aggregated daily counts.
+    """
+
+    barangays, b = np.unique(
+        df["barangay_psgc"].to_numpy(dtype=np.int64), return_inverse=True
+    )
+
+    # Categories re-derived from the values, so they come out sorted
+    species = pd.Categorical(df["species"].astype(str))
+
+    t = (
+        df["date"].to_numpy(dtype="datetime64[D]")
+        - dates[0].to_datetime64().astype("datetime64[D]")
+    ).astype(np.int64)
+
+    n_species = len(species.categories)
+    cells = (b * n_species + species.codes) * len(dates) + t
+
+    return barangays, species.categories, cells
+
+
+def main(csv_path, sparse=False):
+
+    required_cols = ["date", "species", "barangay_psgc"]
+
+    # Load barangay-assigned sightings (typed; only the needed columns)
+    df = read_table(csv_path, columns=required_cols)
+
+    # Sightings without a barangay are not counted (as in groupby)
+    df = df.dropna(subset=["barangay_psgc"])
+
+    # Filter to modeling window
+    df = df[
+        (df["date"] >= START_DATE) &
+        (df["date"] <= END_DATE)
+    ]
+
+    dates = grid_dates(START_DATE, END_DATE)
+    n_days = len(dates)
+
+    barangays, species, cells = grid_coordinates(df, dates)
+    n_species = len(species)
+
+    if sparse:
+        cells, counts = np.unique(cells, return_counts=True)
+
+        group, offset = np.divmod(cells, n_days)
+        b, s = np.divmod(group, n_species)
+
+        coo = pd.DataFrame({
+            "barangay_psgc": barangays[b],
+            "species": pd.Categorical.from_codes(s, species),
+            "date_offset": offset.astype(np.int32),
+            "count": counts
+        })
+
+        write_sparse_grid(coo[SPARSE_COLUMNS], OUTPUT_PATH, START_DATE, END_DATE)
+        print(f"Success. Sparse grid saved to: {OUTPUT_PATH}")
+        return
+
+    n_groups = len(barangays) * n_species
+    counts = np.bincount(cells, minlength=n_groups * n_days)
+
+    full_df = pd.DataFrame({
+        "barangay_psgc": np.repeat(barangays, n_species * n_days),
+        "species": pd.Categorical.from_codes(
+            np.tile(np.repeat(np.arange(n_species), n_days), len(barangays)),
+            species
+        ),
+        "date": np.tile(dates.to_numpy(), n_groups),
+        "count": counts
+    })
+
+    write_table(full_df, OUTPUT_PATH)
+
+    print(f"Success. File saved to: {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+
+    args = [a for a in sys.argv[1:] if a != "--sparse"]
+
+    if len(args) != 1:
+        print("Usage: python aggregate_grid.py input.csv [--sparse]")
+        sys.exit(1)
+
+    main(args[0], sparse="--sparse" in sys.argv[1:])
@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+
+"""
+Usage:
+    python assignment_service.py shapefile.shp [--output sightings.csv]
+        [--batch-size N] [--max-wait SECONDS]
+    python assignment_service.py shapefile.shp --http [--port PORT]
+
+Long-running barangay assignment for incoming sightings. The barangay
+index (barangay_index.py) is loaded once and kept in memory; points are
+assigned in micro-batches with the same within-then-nearest rules as
+assign_barangay.py.
+
+Line mode (default) reads one JSON sighting per line from stdin, e.g.
+
+    {"date": "2024/05/01", "species": "Naja philippinensis",
+     "lat": 14.31, "long": 121.11}
+
+and writes the assigned record as one JSON line to stdout. A batch is
+flushed when it reaches --batch-size or no new line arrives within
+--max-wait seconds. --output also appends the assigned rows to a CSV
+that aggregate_daily_counts.py can read.
+
+HTTP mode serves on localhost:
+    POST /assign   one sighting or a JSON list of them → assigned list
+    GET  /stats    latency / throughput counters
+
+A line that is not valid JSON, or a sighting that cannot be assigned
+(e.g. no lat / long), gives an {"error": ...} line instead and the
+service keeps running; the rest of its batch is still assigned.
+
+Counters are printed to stderr when line mode ends.
+"""
+
+import argparse
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import geopandas as gpd
+import pandas as pd
+
+from barangay_index import INDEX_COLUMNS, UTM, WGS84, load_index
+
+REQUIRED_COLS = ["date", "species", "lat", "long"]
+
+OUTPUT_COLS = [
+    "date",
+    "species",
+    "lat",
+    "long",
+    "barangay_psgc",
+    "barangay_name",
+    "adm3_psgc",
+    "adm2_psgc",
+    "adm1_psgc",
+    "area_km2"
+]
+
+BATCH_SIZE = 256
+MAX_WAIT = 0.05   # seconds
+HTTP_PORT = 8765
+
+
+class BarangayAssigner:
+    """Assigns barangay PSGC codes to sightings; index stays resident."""
+
+    def __init__(self, shapefile_path):
+        self.index = load_index(shapefile_path)
+
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.points = 0
+        self.busy_seconds = 0.0
+        self.max_latency = 0.0
+        self.started = time.monotonic()
+
+    def assign(self, df):
+        """Assigned copy of `df` (date, species, lat, long + PSGC columns)."""
+
+        for col in REQUIRED_COLS:
+            if col not in df.columns:
+                raise ValueError(f"Missing required column: {col}")
+
+        start = time.perf_counter()
+
+        gdf = gpd.GeoDataFrame(
+            df[REQUIRED_COLS].reset_index(drop=True),
+            geometry=gpd.points_from_xy(df["long"], df["lat"]),
+            crs=WGS84
+        )
+
+        # -----------------------------------
+        # STEP 1: Within join
+        # -----------------------------------
+        joined = gpd.sjoin(
+            gdf,
+            self.index.wgs84,
+            how="left",
+            predicate="within"
+        )
+
+        if "index_right" in joined.columns:
+            joined = joined.drop(columns=["index_right"])
+
+        # -----------------------------------
+        # STEP 2: Nearest correction
+        # -----------------------------------
+        unmatched_mask = joined["adm4_psgc"].isnull()
+
+        if unmatched_mask.any():
+
+            # Drop the empty within-join columns so nothing gets suffixed
+            unmatched = joined.loc[unmatched_mask].drop(columns=INDEX_COLUMNS)
+
+            # Project the points only; barangays are stored in UTM already
+            nearest = gpd.sjoin_nearest(
+                unmatched.to_crs(UTM),
+                self.index.utm,
+                how="left",
+                distance_col="distance_m"
+            )
+
+            # Equidistant ties give several rows per point; keep the first
+            nearest = nearest[~nearest.index.duplicated()]
+
+            joined.loc[unmatched_mask, INDEX_COLUMNS] = (
+                nearest[INDEX_COLUMNS].values
+            )
+
+        joined = joined.rename(columns={
+            "adm4_en": "barangay_name",
+            "adm4_psgc": "barangay_psgc"
+        })
+
+        result = pd.DataFrame(joined[OUTPUT_COLS])
+
+        elapsed = time.perf_counter() - start
+        with self.lock:
+            self.batches += 1
+            self.points += len(df)
+            self.busy_seconds += elapsed
+            self.max_latency = max(self.max_latency, elapsed)
+
+        return result
+
+    def assign_records(self, records):
+        """List-of-dicts version of assign(), JSON-ready."""
+
+        if not records:
+            return []
+
+        result = self.assign(pd.DataFrame.from_records(records))
+
+        # NaN → null
+        result = result.astype(object).where(result.notna(), None)
+
+        return result.to_dict(orient="records")
+
+    def stats(self):
+
+        with self.lock:
+            uptime = time.monotonic() - self.started
+            return {
+                "batches": self.batches,
+                "points": self.points,
+                "uptime_s": round(uptime, 3),
+                "mean_batch_latency_ms": round(
+                    1000 * self.busy_seconds / self.batches, 3
+                ) if self.batches else None,
+                "max_batch_latency_ms": round(1000 * self.max_latency, 3),
+                "points_per_busy_s": round(
+                    self.points / self.busy_seconds, 1
+                ) if self.busy_seconds else None,
+                "points_per_s": round(self.points / uptime, 1)
+                if uptime else None
+            }
+
+
+# ─────────────────────────────────────────────
+# LINE MODE
+# ─────────────────────────────────────────────
+def append_csv(df, path):
+
+    new_file = not os.path.exists(path)
+
+    if new_file:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    df.to_csv(path, mode="a", header=new_file, index=False)
+
+
+def iter_batches(stream, batch_size=BATCH_SIZE, max_wait=MAX_WAIT,
+                 on_invalid=None):
+    """Micro-batches of parsed JSON lines from `stream`.
+
+    A batch is emitted when full, or when no new line arrives within
+    `max_wait` seconds, so a slow trickle is still answered promptly.
+    Lines are read by a background thread into a queue: waiting on the
+    queue (not on the file descriptor) also sees lines already buffered
+    by the stream, so a burst fills whole batches.
+
+    Lines that are not valid JSON are skipped and passed, with the
+    error, to `on_invalid(line, error)` if given.
+    """
+
+    lines = queue.Queue()
+
+    def read_lines():
+        for line in stream:
+            lines.put(line)
+        lines.put(None)   # end of stream
+
+    threading.Thread(target=read_lines, daemon=True).start()
+
+    batch = []
+
+    while True:
+
+        try:
+            line = lines.get(timeout=max_wait) if batch else lines.get()
+        except queue.Empty:
+            yield batch
+            batch = []
+            continue
+
+        if line is None:
+            break
+
+        line = line.strip()
+        if line:
+            try:
+                batch.append(json.loads(line))
+            except ValueError as e:
+                if on_invalid is not None:
+                    on_invalid(line, e)
+
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+
+    if batch:
+        yield batch
+
+
+def write_error(message, **context):
+    """One {"error": ...} output line; the service keeps running."""
+
+    sys.stdout.write(json.dumps({"error": message, **context}) + "\n")
+    sys.stdout.flush()
+
+
+def assign_batch(assigner, records):
+    """Assigned records of a batch, skipping (and reporting) bad ones.
+
+    The batch is assigned at once; if that fails (e.g. a record without
+    lat / long), each record is retried alone so only the bad ones drop.
+    """
+
+    try:
+        return assigner.assign_records(records)
+    except (ValueError, KeyError, TypeError):
+        pass
+
+    assigned = []
+    for record in records:
+        try:
+            assigned += assigner.assign_records([record])
+        except (ValueError, KeyError, TypeError) as e:
+            write_error(str(e), input=record)
+
+    return assigned
+
+
+def serve_lines(assigner, output_path=None, batch_size=BATCH_SIZE,
+                max_wait=MAX_WAIT):
+
+    def on_invalid(line, error):
+        write_error(f"invalid JSON: {error}", line=line)
+
+    for records in iter_batches(sys.stdin, batch_size, max_wait, on_invalid):
+
+        assigned = assign_batch(assigner, records)
+
+        for record in assigned:
+            sys.stdout.write(json.dumps(record) + "\n")
+        sys.stdout.flush()
+
+        if output_path and assigned:
+            append_csv(pd.DataFrame(assigned, columns=OUTPUT_COLS), output_path)
+
+    print(json.dumps(assigner.stats()), file=sys.stderr)
+
+
+# ─────────────────────────────────────────────
+# HTTP MODE
+# ─────────────────────────────────────────────
+def make_handler(assigner, output_path=None):
+
+    output_lock = threading.Lock()
+
+    class AssignHandler(BaseHTTPRequestHandler):
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self.send_json(200, assigner.stats())
+            else:
+                self.send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            if self.path != "/assign":
+                self.send_json(404, {"error": "not found"})
+                return
+
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                records = json.loads(self.rfile.read(length))
+                if isinstance(records, dict):
+                    records = [records]
+                assigned = assigner.assign_records(records)
+            except (ValueError, KeyError, TypeError) as e:
+                self.send_json(400, {"error": str(e)})
+                return
+
+            if output_path:
+                with output_lock:
+                    append_csv(
+                        pd.DataFrame(assigned, columns=OUTPUT_COLS),
+                        output_path
+                    )
+
+            self.send_json(200, assigned)
+
+        def log_message(self, format, *args):
+            pass
+
+    return AssignHandler
+
+
+def serve_http(assigner, port=HTTP_PORT, output_path=None):
+
+    server = ThreadingHTTPServer(
+        ("127.0.0.1", port), make_handler(assigner, output_path)
+    )
+
+    print(f"Assigning on http://127.0.0.1:{port} (POST /assign, GET /stats)",
+          file=sys.stderr)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(assigner.stats()), file=sys.stderr)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Streaming barangay assignment of sightings."
+    )
+    parser.add_argument("shapefile")
+    parser.add_argument(
+        "--output",
+        help="also append assigned rows to this CSV"
+    )
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--max-wait", type=float, default=MAX_WAIT)
+    parser.add_argument("--http", action="store_true")
+    parser.add_argument("--port", type=int, default=HTTP_PORT)
+    args = parser.parse_args()
+
+    assigner = BarangayAssigner(args.shapefile)
+
+    if args.http:
+        serve_http(assigner, args.port, args.output)
+    else:
+        serve_lines(assigner, args.output, args.batch_size, args.max_wait)
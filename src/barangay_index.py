@@ -0,0 +1,107 @@
+# ==========================================
+# CACHED BARANGAY POLYGON INDEX
+# ==========================================
+#
+# Parsing the Adm4 shapefile and reprojecting it twice dominates every
+# assign_barangay.py run. The index is built once into a GeoParquet
+# file holding only the columns assignment needs, with the polygons in
+# both CRSs:
+#
+#   geometry      EPSG:4326   point-in-polygon ("within") join
+#   geometry_utm  EPSG:32651  nearest-barangay fallback (metres)
+#
+# A JSON sidecar (<path>.json) records the shapefile it came from and
+# its mtime; the index is rebuilt when the shapefile changes. Loading is
+# lazy and cached per process, with both spatial indexes built up front.
+
+import json
+import os
+
+import geopandas as gpd
+
+INDEX_PATH = "data/barangay_index.parquet"
+
+WGS84 = "EPSG:4326"
+UTM = "EPSG:32651"
+
+INDEX_COLUMNS = [
+    "adm4_psgc",
+    "adm4_en",
+    "adm3_psgc",
+    "adm2_psgc",
+    "adm1_psgc",
+    "area_km2"
+]
+
+_loaded = {}
+
+
+class BarangayIndex:
+    """Barangay polygons in WGS84 and UTM 51N, spatial indexes ready."""
+
+    def __init__(self, gdf):
+        self.wgs84 = gdf[INDEX_COLUMNS + ["geometry"]]
+        self.utm = gpd.GeoDataFrame(
+            gdf[INDEX_COLUMNS],
+            geometry=gdf["geometry_utm"],
+            crs=UTM
+        )
+
+        # STRtrees are otherwise built on the first join
+        self.wgs84.sindex
+        self.utm.sindex
+
+    def __len__(self):
+        return len(self.wgs84)
+
+
+def index_is_current(shapefile_path, index_path=INDEX_PATH):
+
+    if not os.path.exists(index_path) or not os.path.exists(f"{index_path}.json"):
+        return False
+
+    with open(f"{index_path}.json") as f:
+        meta = json.load(f)
+
+    return (
+        meta["shapefile"] == os.path.abspath(shapefile_path)
+        and meta["mtime"] == os.path.getmtime(shapefile_path)
+    )
+
+
+def build_index(shapefile_path, index_path=INDEX_PATH):
+
+    barangays = gpd.read_file(shapefile_path, columns=INDEX_COLUMNS)
+    barangays = barangays.to_crs(WGS84)
+
+    barangays["geometry_utm"] = barangays.geometry.to_crs(UTM)
+
+    os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+    barangays.to_parquet(index_path, index=False)
+
+    with open(f"{index_path}.json", "w") as f:
+        json.dump({
+            "shapefile": os.path.abspath(shapefile_path),
+            "mtime": os.path.getmtime(shapefile_path)
+        }, f)
+
+    print(f"Barangay index built: {index_path} ({len(barangays)} polygons)")
+
+
+def load_index(shapefile_path, index_path=INDEX_PATH):
+    """The BarangayIndex for `shapefile_path`, (re)building it if stale.
+
+    Cached per process, so repeated calls are free.
+    """
+
+    key = (os.path.abspath(shapefile_path), index_path)
+
+    if key in _loaded and index_is_current(shapefile_path, index_path):
+        return _loaded[key]
+
+    if not index_is_current(shapefile_path, index_path):
+        build_index(shapefile_path, index_path)
+
+    _loaded[key] = BarangayIndex(gpd.read_parquet(index_path))
+
+    return _loaded[key]
@@ -1,80 +1,270 @@
 # ==========================================
 # STEP 3: BUILD FINAL MODEL DATASET
 # ==========================================
+#
+# Usage:
+#     python build_model_dataset.py [--memory-budget MB]
+#                                   [--partition-by psgc|month]
+#
+# Without --memory-budget both tables are loaded and merged in memory.
+# With it, counts and environment are read and joined one partition at
+# a time (a PSGC range, or a run of months) sized so that a partition's
+# merged rows fit the budget, and each partition is streamed to the
+# output Parquet file as it is done. PSGC partitions keep the output in
+# the same (barangay, species, date) order as the in-memory join.
 
+import argparse
+
+import numpy as np
 import pandas as pd
+import pyarrow.dataset as ds
+
+from sparse_grid import is_sparse_grid, read_counts, read_sparse_grid
+from table_io import (
+    normalize_types,
+    read_table,
+    table_format,
+    write_table,
+    write_table_chunks
+)
+
+counts_path = "data/redistributed_counts_clean.parquet"
+env_path = "data/environmental_data_clean.parquet"
+output_path = "data/model_dataset_raw.parquet"
+
+env_feature_cols = [
+    "air_temperature",
+    "soil_temperature",
+    "soil_moisture",
+    "LST_C",
+    "landcover"
+]
+
+# Rough in-memory cost of one merged row, merge overhead included
+BYTES_PER_ROW = 256
+
 
 # ----------------------------
 # 1. LOAD CLEAN FILES
 # ----------------------------
 
-counts_path = "data/redistributed_counts_clean.csv"
-env_path = "data/environmental_data_clean.csv"
+def load_counts(psgc_range=None, start_date=None, end_date=None):
 
-counts = pd.read_csv(counts_path)
-env = pd.read_csv(env_path)
+    # Zero days are implicit in a sparse grid; every day needs a row
+    # to carry its environmental features, so read_counts densifies it.
+    return read_counts(
+        counts_path,
+        start_date=start_date,
+        end_date=end_date,
+        psgc_range=psgc_range
+    )
 
-print("Files loaded.")
-print("Counts shape:", counts.shape)
-print("Env shape:", env.shape)
 
+def load_env(psgc_range=None, start_date=None, end_date=None):
 
-# ----------------------------
-# 2. ENSURE DATATYPES MATCH
-# ----------------------------
+    filters = []
+    if psgc_range is not None:
+        filters.append(("adm4_psgc", ">=", psgc_range[0]))
+        filters.append(("adm4_psgc", "<=", psgc_range[1]))
+    if start_date is not None:
+        filters.append(("date", ">=", start_date))
+    if end_date is not None:
+        filters.append(("date", "<=", end_date))
+
+    return read_table(
+        env_path,
+        columns=["adm4_psgc", "date"] + env_feature_cols,
+        filters=filters or None
+    )
 
-counts["barangay_psgc"] = counts["barangay_psgc"].astype(int)
-env["adm4_psgc"] = env["adm4_psgc"].astype(int)
 
-counts["date"] = pd.to_datetime(counts["date"])
-env["date"] = pd.to_datetime(env["date"])
+# ----------------------------
+# 2. DATATYPES
+# ----------------------------
+# read_table returns int64 PSGC and datetime dates for both tables.
 
 
 # ----------------------------
 # 3. MERGE COUNTS + ENVIRONMENT
 # ----------------------------
 
-df = counts.merge(
-    env,
-    left_on=["barangay_psgc", "date"],
-    right_on=["adm4_psgc", "date"],
-    how="left"
-)
+def join(counts, env):
+
+    df = counts.merge(
+        env,
+        left_on=["barangay_psgc", "date"],
+        right_on=["adm4_psgc", "date"],
+        how="left"
+    )
 
-df = df.drop(columns=["adm4_psgc"])
+    df = df.drop(columns=["adm4_psgc"])
 
-print("Merged dataset shape:", df.shape)
+    # Sort for time series
+    return df.sort_values(
+        ["barangay_psgc", "species", "date"]
+    ).reset_index(drop=True)
 
 
 # ----------------------------
-# 4. CHECK FOR ENVIRONMENTAL GAPS
+# PARTITION PLANNING
 # ----------------------------
 
-missing_env = df[[
-    "air_temperature",
-    "soil_temperature",
-    "soil_moisture",
-    "LST_C",
-    "landcover"
-]].isna().sum()
+def count_grid_extent(path):
+    """(sorted barangay codes, first date, last date, total rows).
 
-print("\nMissing environmental values:")
-print(missing_env)
+    Scans only the barangay_psgc and date columns, batch by batch.
+    """
 
+    if is_sparse_grid(path):
+        coo, dates = read_sparse_grid(path)
+        barangays = np.sort(coo["barangay_psgc"].unique())
+        n_rows = len(barangays) * coo["species"].nunique() * len(dates)
+        return barangays, dates[0], dates[-1], n_rows
 
-# ----------------------------
-# 5. SORT FOR TIME SERIES
-# ----------------------------
+    if table_format(path) == "csv":
+        df = read_table(path, columns=["barangay_psgc", "date"])
+        return (
+            np.sort(df["barangay_psgc"].unique()),
+            df["date"].min(), df["date"].max(), len(df)
+        )
+
+    dataset = ds.dataset(path, format="parquet", partitioning="hive")
+
+    barangays = np.array([], dtype=np.int64)
+    first, last, n_rows = None, None, 0
+
+    for batch in dataset.to_batches(columns=["barangay_psgc", "date"]):
+        part = normalize_types(batch.to_pandas(date_as_object=False))
+        if part.empty:
+            continue
+        barangays = np.union1d(barangays, part["barangay_psgc"].unique())
+        lo, hi = part["date"].min(), part["date"].max()
+        first = lo if first is None else min(first, lo)
+        last = hi if last is None else max(last, hi)
+        n_rows += len(part)
+
+    return barangays, first, last, n_rows
+
+
+def plan_partitions(partition_by, budget_bytes):
+    """Keyword arguments for load_counts / load_env, one per partition."""
+
+    barangays, first, last, n_rows = count_grid_extent(counts_path)
 
-df = df.sort_values(
-    ["barangay_psgc", "species", "date"]
-).reset_index(drop=True)
+    if n_rows == 0:
+        return []
+
+    if partition_by == "psgc":
+        rows_per_barangay = n_rows / len(barangays)
+        size = max(1, int(budget_bytes // (rows_per_barangay * BYTES_PER_ROW)))
+        return [
+            {"psgc_range": (int(block[0]), int(block[-1]))}
+            for block in (
+                barangays[i:i + size] for i in range(0, len(barangays), size)
+            )
+        ]
+
+    months = pd.date_range(first.to_period("M").to_timestamp(), last, freq="MS")
+    rows_per_month = n_rows / ((last - first).days + 1) * 31
+    size = max(1, int(budget_bytes // (rows_per_month * BYTES_PER_ROW)))
+
+    return [
+        {
+            "start_date": months[i],
+            "end_date": months[min(i + size, len(months)) - 1]
+            + pd.offsets.MonthEnd(0)
+        }
+        for i in range(0, len(months), size)
+    ]
 
 
 # ----------------------------
-# 6. SAVE RAW MERGED DATA
+# BUILD
 # ----------------------------
 
-df.to_csv("data/model_dataset_raw.csv", index=False)
+def build_in_memory():
+
+    counts = load_counts()
+    env = load_env()
+
+    print("Files loaded.")
+    print("Counts shape:", counts.shape)
+    print("Env shape:", env.shape)
+
+    df = join(counts, env)
+
+    print("Merged dataset shape:", df.shape)
+
+    # ----------------------------
+    # 4. CHECK FOR ENVIRONMENTAL GAPS
+    # ----------------------------
+
+    print("\nMissing environmental values:")
+    print(df[env_feature_cols].isna().sum())
+
+    # ----------------------------
+    # 5. SAVE RAW MERGED DATA
+    # ----------------------------
+
+    write_table(df, output_path)
+
+
+def build_partitioned(partition_by, budget_mb):
+
+    partitions = plan_partitions(partition_by, budget_mb * 1024 * 1024)
+
+    print(f"Joining in {len(partitions)} {partition_by} partitions "
+          f"(budget {budget_mb} MB).")
+
+    missing_env = pd.Series(0, index=env_feature_cols)
+
+    def joined_partitions():
+        nonlocal missing_env
+
+        for i, part in enumerate(partitions):
+
+            df = join(load_counts(**part), load_env(**part))
+
+            missing_env += df[env_feature_cols].isna().sum()
+
+            print(f"  [{i + 1}/{len(partitions)}] {part}: {len(df)} rows")
+
+            yield df
+
+    n_rows = write_table_chunks(joined_partitions(), output_path)
+
+    if n_rows == 0:
+        print("No count rows to join.")
+        return
+
+    print("Merged dataset rows:", n_rows)
+    print("\nMissing environmental values:")
+    print(missing_env)
+
+
+def main(budget_mb=None, partition_by="psgc"):
+
+    if budget_mb is None:
+        build_in_memory()
+    else:
+        build_partitioned(partition_by, budget_mb)
+
+    print(f"\nSaved: {output_path}")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Join daily counts with environmental features."
+    )
+    parser.add_argument(
+        "--memory-budget", type=float, metavar="MB",
+        help="join out of core, partitions sized to this budget"
+    )
+    parser.add_argument(
+        "--partition-by", choices=["psgc", "month"], default="psgc",
+        help="partition key for --memory-budget (default: psgc)"
+    )
+    args = parser.parse_args()
 
-print("\nSaved: data/model_dataset_raw.csv")
\ No newline at end of file
+    main(args.memory_budget, args.partition_by)
@@ -2,66 +2,250 @@
 # BUILD SEQUENCES FOR 1-DAY AND 7-DAY
 # ==========================================
 
-import pandas as pd
+import argparse
+
 import numpy as np
+from numpy.lib.format import open_memmap
+from numpy.lib.stride_tricks import sliding_window_view
 import os
 
+from table_io import read_table
+
 SEQ_LENGTH = 14
 HORIZONS = {
     "1day": 1,
     "7day": 7
 }
 
-df = pd.read_csv("data/model_dataset.csv")
-df["date"] = pd.to_datetime(df["date"])
+FEATURE_COLS = [
+    "count",
+    "air_temperature",
+    "soil_temperature",
+    "soil_moisture",
+    "LST_C",
+    "landcover"
+]
 
-species_list = df["species"].unique()
+INPUT_PATH = "data/model_dataset.parquet"
+OUTPUT_DIR = "data/sequence_multi"
 
-os.makedirs("data/sequence_multi", exist_ok=True)
+# Windows copied into the memory-mapped outputs per step
+CHUNK_WINDOWS = 65536
 
-for sp in species_list:
+# Barangay and target date of every window, saved next to X_*.npy
+INDEX_DTYPE = np.dtype([
+    ("barangay_psgc", np.int64),
+    ("target_date", "datetime64[D]")
+])
 
-    print(f"\nProcessing species: {sp}")
 
-    sp_df = df[df["species"] == sp].copy()
-    sp_df = sp_df.sort_values(["barangay_psgc", "date"])
+def window_starts(offsets, lengths, horizon_days):
+    """Row index of every valid window start, group by group.
+
+    `offsets` and `lengths` describe contiguous (barangay) groups in a
+    row-sorted array. A window starting at row s covers s..s+SEQ_LENGTH-1
+    and its target is row s+SEQ_LENGTH+horizon_days-1 of the same group.
+    """
+
+    n_windows = np.clip(lengths - SEQ_LENGTH - horizon_days + 1, 0, None)
+    group_start = np.cumsum(n_windows) - n_windows
+
+    local = np.arange(n_windows.sum()) - np.repeat(group_start, n_windows)
+
+    return np.repeat(offsets, n_windows) + local
+
+
+def complete_rows(values, chunk_rows=CHUNK_WINDOWS):
+    """True for every base row without a NaN feature (chunked)."""
+
+    complete = np.empty(len(values), dtype=bool)
+
+    for i in range(0, len(values), chunk_rows):
+        complete[i:i + chunk_rows] = ~np.isnan(
+            values[i:i + chunk_rows]
+        ).any(axis=1)
+
+    return complete
 
-    feature_cols = [
-        "count",
-        "air_temperature",
-        "soil_temperature",
-        "soil_moisture",
-        "LST_C",
-        "landcover"
+
+def complete_windows(starts, complete, horizon_days):
+    """Starts whose rows s .. s+SEQ_LENGTH+horizon_days-1 are all complete.
+
+    Checking the whole span, not just the window and its target, keeps
+    the windows of a longer horizon a subset of a shorter one's, as
+    run_multi_horizon.py --multi-output expects.
+    """
+
+    gaps = np.concatenate([[0], np.cumsum(~complete)])
+
+    return starts[
+        gaps[starts + SEQ_LENGTH + horizon_days] == gaps[starts]
     ]
 
-    for horizon_name, horizon_days in HORIZONS.items():
 
-        print(f"  Building {horizon_name} sequences...")
+def build_species(sp_df, safe_name):
+
+    sp_df = sp_df.sort_values(["barangay_psgc", "date"])
+
+    # One contiguous float32 block per species; every window is a view into it
+    values = np.ascontiguousarray(
+        sp_df[FEATURE_COLS].to_numpy(dtype=np.float32)
+    )
+
+    psgc = sp_df["barangay_psgc"].to_numpy(dtype=np.int64)
+    dates = sp_df["date"].to_numpy(dtype="datetime64[D]")
+    boundaries = np.flatnonzero(psgc[1:] != psgc[:-1]) + 1
+    offsets = np.concatenate([[0], boundaries])
+    lengths = np.diff(np.concatenate([offsets, [len(psgc)]]))
+
+    # Compact base array for the lazy training pipeline (window_dataset.py);
+    # a --from-cube run leaves a symlink here, which np.save would follow
+    base_path = f"{OUTPUT_DIR}/base_{safe_name}.npy"
+    if os.path.lexists(base_path):
+        os.remove(base_path)
+    np.save(base_path, values)
+
+    write_sequences(
+        values, offsets, lengths,
+        lambda rows: (psgc[rows], dates[rows]),
+        safe_name
+    )
 
-        X_list = []
-        y_list = []
 
-        for barangay, group in sp_df.groupby("barangay_psgc"):
+def build_species_from_cube(safe_name):
+    """Sequences from the species' feature cube (feature_cube.py).
 
-            group = group.sort_values("date")
-            values = group[feature_cols].values
+    The cube, flattened to (barangays * days, features), is the base
+    array: base_{sp}.npy becomes a symlink to it instead of a copy.
+    """
 
-            max_index = len(values) - SEQ_LENGTH - horizon_days + 1
+    from feature_cube import CUBE_DIR, cube_base, load_cube
 
-            for i in range(max_index):
-                X_list.append(values[i:i+SEQ_LENGTH])
-                y_list.append(values[i+SEQ_LENGTH+horizon_days-1][0])
+    cube, psgc, dates = load_cube(safe_name)
+    n_barangays, n_days = cube.shape[:2]
 
-        X = np.array(X_list, dtype=np.float32)
-        y = np.array(y_list, dtype=np.float32)
+    base_path = f"{OUTPUT_DIR}/base_{safe_name}.npy"
+    if os.path.lexists(base_path):
+        os.remove(base_path)
+    os.symlink(
+        os.path.relpath(f"{CUBE_DIR}/cube_{safe_name}.npy", OUTPUT_DIR),
+        base_path
+    )
 
-        safe_name = sp.replace(" ", "_")
+    write_sequences(
+        cube_base(cube),
+        np.arange(n_barangays, dtype=np.int64) * n_days,
+        np.full(n_barangays, n_days),
+        lambda rows: (psgc[rows // n_days], dates[rows % n_days]),
+        safe_name
+    )
 
-        np.save(f"data/sequence_multi/X_{safe_name}_{horizon_name}.npy", X)
-        np.save(f"data/sequence_multi/y_{safe_name}_{horizon_name}.npy", y)
+
+def write_sequences(values, offsets, lengths, row_index, safe_name):
+    """Window starts, index and X / y arrays of every horizon.
+
+    `values` is the (rows, features) base array made of the contiguous
+    barangay groups (`offsets`, `lengths`); `row_index(rows)` returns
+    the (psgc, date) of the given rows. Windows with a NaN in their
+    rows or target (days missing from a feature cube) are skipped.
+    """
+
+    complete = complete_rows(values)
+
+    # (rows - SEQ_LENGTH + 1, SEQ_LENGTH, features), zero-copy
+    if len(values) >= SEQ_LENGTH:
+        windows = sliding_window_view(values, SEQ_LENGTH, axis=0)
+        windows = windows.transpose(0, 2, 1)
+
+    for horizon_name, horizon_days in HORIZONS.items():
+
+        print(f"  Building {horizon_name} sequences...")
+
+        starts = complete_windows(
+            window_starts(offsets, lengths, horizon_days),
+            complete,
+            horizon_days
+        )
+        targets = starts + SEQ_LENGTH + horizon_days - 1
+
+        np.save(
+            f"{OUTPUT_DIR}/starts_{safe_name}_{horizon_name}.npy",
+            starts
+        )
+
+        index = np.empty(len(starts), dtype=INDEX_DTYPE)
+        index["barangay_psgc"], index["target_date"] = row_index(targets)
+
+        np.save(
+            f"{OUTPUT_DIR}/index_{safe_name}_{horizon_name}.npy",
+            index
+        )
+
+        X = open_memmap(
+            f"{OUTPUT_DIR}/X_{safe_name}_{horizon_name}.npy",
+            mode="w+",
+            dtype=np.float32,
+            shape=(len(starts), SEQ_LENGTH, len(FEATURE_COLS))
+        )
+        y = open_memmap(
+            f"{OUTPUT_DIR}/y_{safe_name}_{horizon_name}.npy",
+            mode="w+",
+            dtype=np.float32,
+            shape=(len(starts),)
+        )
+
+        for i in range(0, len(starts), CHUNK_WINDOWS):
+            chunk = starts[i:i + CHUNK_WINDOWS]
+            X[i:i + len(chunk)] = windows[chunk]
+            y[i:i + len(chunk)] = values[targets[i:i + CHUNK_WINDOWS], 0]
+
+        X.flush()
+        y.flush()
 
         print("    X shape:", X.shape)
         print("    y shape:", y.shape)
 
-print("\nDone building multi-horizon sequences.")
\ No newline at end of file
+        del X, y
+
+
+def main(input_path=INPUT_PATH, from_cube=False):
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    if from_cube:
+        from feature_cube import cube_species
+
+        for safe_name in cube_species():
+            print(f"\nProcessing species cube: {safe_name}")
+            build_species_from_cube(safe_name)
+
+        print("\nDone building multi-horizon sequences.")
+        return
+
+    df = read_table(
+        input_path,
+        columns=["barangay_psgc", "species", "date"] + FEATURE_COLS
+    )
+
+    for sp, sp_df in df.groupby("species", sort=False, observed=True):
+
+        print(f"\nProcessing species: {sp}")
+
+        build_species(sp_df, sp.replace(" ", "_"))
+
+    print("\nDone building multi-horizon sequences.")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Build multi-horizon window arrays per species."
+    )
+    parser.add_argument(
+        "--from-cube",
+        action="store_true",
+        help="slice the feature cubes (feature_cube.py) instead of the table"
+    )
+    args = parser.parse_args()
+
+    main(from_cube=args.from_cube)
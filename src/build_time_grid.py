@@ -2,30 +2,30 @@
 
 """
 Usage:
-    python build_time_grid.py input.csv
+    python build_time_grid.py input.csv [--sparse]
+
+--sparse writes only the non-zero cells as COO triples
+(barangay_psgc, species, date_offset, count); see sparse_grid.py.
 """
 
 import sys
-import os
 import pandas as pd
 
-OUTPUT_PATH = "data/daily_time_grid.csv"
+from sparse_grid import to_sparse, write_sparse_grid
+from table_io import read_table, write_table
+
+OUTPUT_PATH = "data/daily_time_grid.parquet"
 
 START_DATE = "2022-01-01"
 END_DATE   = "2026-01-31"
 
 
-def main(csv_path):
-
-    # Load aggregated daily counts
-    df = pd.read_csv(csv_path)
+def main(csv_path, sparse=False):
 
     required_cols = ["barangay_psgc", "species", "date", "count"]
-    for col in required_cols:
-        if col not in df.columns:
-            raise ValueError(f"Missing required column: {col}")
 
-    df["date"] = pd.to_datetime(df["date"])
+    # Load aggregated daily counts
+    df = read_table(csv_path, columns=required_cols)
 
     # Filter to modeling window
     df = df[
@@ -33,6 +33,13 @@ def main(csv_path):
         (df["date"] <= END_DATE)
     ]
 
+    if sparse:
+        write_sparse_grid(
+            to_sparse(df, START_DATE), OUTPUT_PATH, START_DATE, END_DATE
+        )
+        print(f"Success. Sparse grid saved to: {OUTPUT_PATH}")
+        return
+
     # Get unique spatial + species combinations
     barangays = df["barangay_psgc"].unique()
     species_list = df["species"].unique()
@@ -62,16 +69,17 @@ def main(csv_path):
     # Fill missing counts with zero
     full_df["count"] = full_df["count"].fillna(0).astype(int)
 
-    os.makedirs("data", exist_ok=True)
-    full_df.to_csv(OUTPUT_PATH, index=False)
+    write_table(full_df, OUTPUT_PATH)
 
     print(f"Success. File saved to: {OUTPUT_PATH}")
 
 
 if __name__ == "__main__":
 
-    if len(sys.argv) != 2:
-        print("Usage: python build_time_grid.py input.csv")
+    args = [a for a in sys.argv[1:] if a != "--sparse"]
+
+    if len(args) != 1:
+        print("Usage: python build_time_grid.py input.csv [--sparse]")
         sys.exit(1)
 
-    main(sys.argv[1])
+    main(args[0], sparse="--sparse" in sys.argv[1:])
@@ -10,8 +10,11 @@ Purpose:
 - NO new columns
 """
 
+import functools
 import sys
 import re
+
+import numpy as np
 import pandas as pd
 
 # ─────────────────────────────────────────────
@@ -72,76 +75,122 @@ CLARIFICATIONS = {
 # ─────────────────────────────────────────────
 # LOCATION CLEANER
 # ─────────────────────────────────────────────
-def clean_location(loc: str) -> str:
-    if not isinstance(loc, str):
-        return ""
-
-    loc = loc.strip()
-    if loc in {"", "-", "."}:
-        return ""
-
-    # Normalize punctuation
-    loc = loc.replace("..", "").replace(".", " ")
-    loc = re.sub(r"\s+", " ", loc)
-
-    # Remove noise words
-    loc = re.sub(r"\btia\b", "", loc, flags=re.I)
-    loc = re.sub(r"\bptpa\b", "", loc, flags=re.I)
-    loc = re.sub(r"\bsdo\b", "", loc, flags=re.I)
-
-    # Remove ALL existing Philippines (we re-add once)
-    loc = re.sub(r"\bPhilippines\b", "", loc, flags=re.I)
-
-    # Normalize "Province of X" → "X Province"
-    loc = re.sub(
-        r"\bprovince\s+of\s+([A-Za-z\s]+)",
-        r"\1 Province",
-        loc,
-        flags=re.I
-    )
+class LocationNormalizer:
+    """clean_location with every pattern compiled once.
+
+    SHORTCUTS are merged into one alternation of named groups, tried in
+    dict order at each position; the matched group name picks the
+    replacement. No replacement is matched by a later shortcut, so this
+    single pass gives the same result as substituting them one by one.
+    Results are memoized per raw string.
+    """
+
+    def __init__(self, shortcuts=SHORTCUTS, clarifications=CLARIFICATIONS,
+                 cache_size=None):
+        self.noise = re.compile(r"\b(?:tia|ptpa|sdo)\b", re.I)
+        self.philippines = re.compile(r"\bPhilippines\b", re.I)
+        self.province_of = re.compile(r"\bprovince\s+of\s+([A-Za-z\s]+)", re.I)
+        self.spaces = re.compile(r"\s+")
+
+        self.clarifications = [
+            (re.compile(pat, re.I), rep) for pat, rep in clarifications.items()
+        ]
+
+        self.replacements = {}
+        alternatives = []
+        for i, (pat, rep) in enumerate(shortcuts.items()):
+            self.replacements[f"s{i}"] = rep
+            alternatives.append(f"(?P<s{i}>{pat})")
+        self.shortcuts = re.compile("|".join(alternatives), re.I)
+
+        self.city_sep = re.compile(r"\b(city|cty)\s+", re.I)
+        self.city = re.compile(r"\b(city|cty)\b", re.I)
+        self.islands = [
+            (ig, re.compile(rf"\b{ig}\b", re.I)) for ig in ISLAND_GROUPS
+        ]
+        self.commas = re.compile(r"\s*,\s*")
+        self.space_comma = re.compile(r"\s+,")
+
+        self.clean = functools.lru_cache(maxsize=cache_size)(self._clean)
+
+    def _shortcut(self, match):
+        return self.replacements[match.lastgroup]
+
+    def _clean(self, loc):
+        if not isinstance(loc, str):
+            return ""
+
+        loc = loc.strip()
+        if loc in {"", "-", "."}:
+            return ""
 
-    # Clarifications first
-    for pat, rep in CLARIFICATIONS.items():
-        if re.search(pat, loc, flags=re.I):
-            loc = rep
+        # Normalize punctuation
+        loc = loc.replace("..", "").replace(".", " ")
+        loc = self.spaces.sub(" ", loc)
 
-    # Shortcuts
-    for pat, rep in SHORTCUTS.items():
-        loc = re.sub(pat, rep, loc, flags=re.I)
+        # Remove noise words
+        loc = self.noise.sub("", loc)
 
-    # Extract ZIP
-    zip_match = ZIP_PATTERN.search(loc)
-    zip_code = zip_match.group(0) if zip_match else None
-    if zip_code:
-        loc = ZIP_PATTERN.sub("", loc)
+        # Remove ALL existing Philippines (we re-add once)
+        loc = self.philippines.sub("", loc)
 
-    # City cleanup
-    loc = re.sub(r"\b(city|cty)\s+", ", ", loc, flags=re.I)
-    loc = re.sub(r"\b(city|cty)\b", "", loc, flags=re.I)
+        # Normalize "Province of X" → "X Province"
+        loc = self.province_of.sub(r"\1 Province", loc)
 
-    # Extract island group
-    island = None
-    for ig in ISLAND_GROUPS:
-        if re.search(rf"\b{ig}\b", loc, flags=re.I):
-            island = ig
-            loc = re.sub(rf"\b{ig}\b", "", loc, flags=re.I)
+        # Clarifications first
+        for pat, rep in self.clarifications:
+            if pat.search(loc):
+                loc = rep
 
-    # Cleanup commas
-    loc = re.sub(r"\s*,\s*", ", ", loc).strip(", ")
+        # Shortcuts (single pass)
+        loc = self.shortcuts.sub(self._shortcut, loc)
 
-    # Rebuild canonical ending
-    if island:
-        loc = f"{loc}, {island}"
+        # Extract ZIP
+        zip_match = ZIP_PATTERN.search(loc)
+        zip_code = zip_match.group(0) if zip_match else None
+        if zip_code:
+            loc = ZIP_PATTERN.sub("", loc)
 
-    loc = f"{loc}, Philippines"
+        # City cleanup
+        loc = self.city_sep.sub(", ", loc)
+        loc = self.city.sub("", loc)
 
-    if zip_code:
-        loc = f"{loc} {zip_code}"
+        # Extract island group
+        island = None
+        for ig, pat in self.islands:
+            if pat.search(loc):
+                island = ig
+                loc = pat.sub("", loc)
 
-    loc = re.sub(r"\s+,", ",", loc)
-    loc = re.sub(r"\s+", " ", loc).strip(", ")
+        # Cleanup commas
+        loc = self.commas.sub(", ", loc).strip(", ")
 
-    return loc
+        # Rebuild canonical ending
+        if island:
+            loc = f"{loc}, {island}"
+
+        loc = f"{loc}, Philippines"
+
+        if zip_code:
+            loc = f"{loc} {zip_code}"
+
+        loc = self.space_comma.sub(",", loc)
+        loc = self.spaces.sub(" ", loc).strip(", ")
+
+        return loc
+
+    def clean_series(self, locations):
+        """Clean each unique value once and map the results back."""
+        codes, uniques = pd.factorize(locations, use_na_sentinel=False)
+        cleaned = np.array([self.clean(u) for u in uniques], dtype=object)
+        return pd.Series(cleaned[codes], index=locations.index)
+
+
+normalizer = LocationNormalizer()
+
+
+def clean_location(loc: str) -> str:
+    return normalizer.clean(loc)
 
 
 # ─────────────────────────────────────────────
@@ -178,7 +227,7 @@ def main(input_csv, output_csv):
 
     # ── LOCATION CLEANING ──
     before = len(df)
-    df["location"] = df["location"].apply(clean_location)
+    df["location"] = normalizer.clean_series(df["location"])
     df = df[df["location"] != ""]
 
     print(f"❌ Dropped invalid locations: {before - len(df)}")
@@ -2,17 +2,39 @@
 # STEP 2: DATA CLEANING & HARMONIZATION
 # ==========================================
 
-import pandas as pd
+from sparse_grid import is_sparse_grid, read_sparse_grid, write_sparse_grid
+from table_io import read_table, write_table
 
 # ----------------------------
 # 1. LOAD FILES
 # ----------------------------
 
-counts_path = "data/redistributed_counts.csv"
+counts_path = "data/redistributed_counts.parquet"
 env_path = "data/environmental_data.csv"
 
-counts = pd.read_csv(counts_path)
-env = pd.read_csv(env_path)
+counts_cols = ["barangay_psgc", "species", "date", "count"]
+env_cols = [
+    "adm4_psgc",
+    "date",
+    "air_temperature",
+    "soil_temperature",
+    "soil_moisture",
+    "LST_C",
+    "landcover"
+]
+
+# Sparse grids (build_time_grid.py --sparse) stay sparse here;
+# build_model_dataset.py restores the zero days at the join.
+sparse_counts = is_sparse_grid(counts_path)
+
+if sparse_counts:
+    counts, grid_dates = read_sparse_grid(counts_path)
+    counts_day_col = "date_offset"
+else:
+    counts = read_table(counts_path, columns=counts_cols)
+    counts_day_col = "date"
+
+env = read_table(env_path, columns=env_cols)
 
 print("Files loaded.")
 print("Counts shape:", counts.shape)
@@ -20,27 +42,11 @@ print("Env shape:", env.shape)
 
 
 # ----------------------------
-# 2. FIX PSGC DATATYPE
+# 2-3. PSGC / DATE DATATYPES
 # ----------------------------
-# Sometimes PSGC loads as float (e.g., 102802046.0)
-# That breaks merging.
-
-counts["barangay_psgc"] = counts["barangay_psgc"].astype(float).astype(int)
-env["adm4_psgc"] = env["adm4_psgc"].astype(float).astype(int)
-
-print("PSGC converted to int.")
-
-
-# ----------------------------
-# 3. FIX DATE FORMAT
-# ----------------------------
-# Neural networks require consistent temporal ordering.
-# Merge requires identical datetime dtype.
-
-counts["date"] = pd.to_datetime(counts["date"])
-env["date"] = pd.to_datetime(env["date"])
-
-print("Dates converted to datetime.")
+# read_table already returns PSGC as int64 (CSV exports carry it as
+# float, e.g. 102802046.0, which breaks merging) and dates as datetime
+# (merge requires identical datetime dtype).
 
 
 # ----------------------------
@@ -48,7 +54,7 @@ print("Dates converted to datetime.")
 # ----------------------------
 
 counts = counts.drop_duplicates(
-    subset=["barangay_psgc", "species", "date"]
+    subset=["barangay_psgc", "species", counts_day_col]
 )
 
 env = env.drop_duplicates(
@@ -63,7 +69,7 @@ print("Duplicates removed.")
 # ----------------------------
 
 counts = counts.sort_values(
-    ["barangay_psgc", "species", "date"]
+    ["barangay_psgc", "species", counts_day_col]
 ).reset_index(drop=True)
 
 env = env.sort_values(
@@ -91,9 +97,14 @@ print(env.isna().sum())
 # 7. SAVE CLEANED VERSIONS
 # ----------------------------
 
-counts.to_csv("data/clean_counts.csv", index=False)
-env.to_csv("data/clean_env.csv", index=False)
+if sparse_counts:
+    write_sparse_grid(
+        counts, "data/clean_counts.parquet", grid_dates[0], grid_dates[-1]
+    )
+else:
+    write_table(counts, "data/clean_counts.parquet")
+write_table(env, "data/clean_env.parquet")
 
 print("\nCleaned files saved:")
-print("data/clean_counts.csv")
-print("data/clean_env.csv")
\ No newline at end of file
+print("data/clean_counts.parquet")
+print("data/clean_env.parquet")
\ No newline at end of file
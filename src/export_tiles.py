@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+
+"""
+Usage:
+    python export_tiles.py [--min-zoom Z] [--max-zoom Z]
+        [--species SP ...] [--horizons H ...]
+
+Exports the HSI maps (outputs_multi/{sp}_{horizon}_HSI.csv joined to
+the Adm4 geometry) as XYZ PNG tile pyramids:
+
+    tiles/{sp}_{horizon}/{z}/{x}/{y}.png     256 x 256, Web Mercator
+
+which any slippy-map client (Leaflet, OpenLayers, QGIS "XYZ Tiles")
+reads with the URL template tiles/{sp}_{horizon}/{z}/{x}/{y}.png.
+
+Geometry comes from the map geometry cache (map_geometry.py): each zoom
+uses the coarsest simplification level that stays under half a tile
+pixel. Each tile's barangay labels are rasterized once and coloured
+for every species / horizon with a lookup table; tiles with no
+barangay with a value are not written.
+"""
+
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from map_geometry import (
+    BARANGAY_SHP,
+    COUNTRY_SHP,
+    cache_bounds,
+    ensure_cache,
+    level_for,
+    load_level
+)
+
+HSI_FOLDER = "outputs_multi"
+OUTPUT_DIR = "tiles"
+
+TILE_SIZE = 256
+MIN_ZOOM = 5
+MAX_ZOOM = 11
+
+# Half the Web Mercator world width (metres)
+MERCATOR_HALF = 20037508.342789244
+
+species_list = [
+    "Naja_philippinensis",
+    "Naja_samarensis",
+    "Ophiophagus_hannah"
+]
+
+horizons = ["1day", "7day"]
+
+
+def lonlat_to_tile(lon, lat, zoom):
+
+    n = 2 ** zoom
+    lat = math.radians(lat)
+
+    x = int((lon + 180) / 360 * n)
+    y = int((1 - math.asinh(math.tan(lat)) / math.pi) / 2 * n)
+
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_bounds(x, y, zoom):
+    """(minx, miny, maxx, maxy) of tile x, y in EPSG:3857 metres."""
+
+    size = 2 * MERCATOR_HALF / 2 ** zoom
+
+    minx = -MERCATOR_HALF + x * size
+    maxy = MERCATOR_HALF - y * size
+
+    return minx, maxy - size, minx + size, maxy
+
+
+def zoom_pixel_degrees(zoom):
+
+    return 360 / (TILE_SIZE * 2 ** zoom)
+
+
+def hsi_colors(psgc, sp, horizon):
+    """RGBA lookup table indexed by label (0 and no-value: transparent)."""
+
+    import matplotlib
+
+    hsi = pd.read_csv(f"{HSI_FOLDER}/{sp}_{horizon}_HSI.csv")
+
+    rows = pd.Index(psgc).get_indexer(hsi["barangay_psgc"].astype("int64"))
+    found = rows >= 0
+
+    lut = np.zeros((len(psgc) + 1, 4), dtype=np.uint8)
+    colors = matplotlib.colormaps["plasma"](
+        np.clip(hsi["HSI"].to_numpy()[found], 0, 1)
+    )
+    lut[rows[found] + 1] = np.round(colors * 255).astype(np.uint8)
+
+    return lut
+
+
+def export_tiles(jobs, min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM):
+
+    from PIL import Image
+    from rasterio.features import rasterize
+    from rasterio.transform import from_bounds
+    from shapely.geometry import box
+
+    ensure_cache(BARANGAY_SHP, COUNTRY_SHP)
+
+    minx, miny, maxx, maxy = cache_bounds()
+
+    # Every level lists barangays in the same order, so labels match
+    psgc = load_level(0)[0]["adm4_psgc"].to_numpy()
+    luts = {job: hsi_colors(psgc, *job) for job in jobs}
+
+    for zoom in range(min_zoom, max_zoom + 1):
+
+        start = time.perf_counter()
+
+        barangays, _ = load_level(level_for(zoom_pixel_degrees(zoom)))
+        barangays = barangays.to_crs("EPSG:3857")
+        geoms = barangays.geometry.to_numpy()
+        tree = barangays.sindex
+
+        x0, y0 = lonlat_to_tile(minx, maxy, zoom)
+        x1, y1 = lonlat_to_tile(maxx, miny, zoom)
+
+        written = 0
+
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+
+                bounds = tile_bounds(x, y, zoom)
+
+                hits = tree.query(box(*bounds))
+                if len(hits) == 0:
+                    continue
+
+                labels = rasterize(
+                    zip(geoms[hits], hits + 1),
+                    out_shape=(TILE_SIZE, TILE_SIZE),
+                    transform=from_bounds(*bounds, TILE_SIZE, TILE_SIZE),
+                    fill=0,
+                    dtype="int32"
+                )
+
+                if not labels.any():
+                    continue
+
+                for (sp, horizon), lut in luts.items():
+
+                    rgba = lut[labels]
+                    if not rgba[..., 3].any():
+                        continue
+
+                    tile_dir = os.path.join(
+                        OUTPUT_DIR, f"{sp}_{horizon}", str(zoom), str(x)
+                    )
+                    os.makedirs(tile_dir, exist_ok=True)
+
+                    Image.fromarray(rgba, "RGBA").save(
+                        os.path.join(tile_dir, f"{y}.png"), optimize=True
+                    )
+                    written += 1
+
+        print(f"  zoom {zoom}: {written} tiles "
+              f"({time.perf_counter() - start:.1f} s)")
+
+
+def main(min_zoom=MIN_ZOOM, max_zoom=MAX_ZOOM, species=None,
+         horizon_names=None):
+
+    jobs = [
+        (sp, horizon)
+        for sp in (species or species_list)
+        for horizon in (horizon_names or horizons)
+    ]
+
+    export_tiles(jobs, min_zoom, max_zoom)
+
+    print(f"Tiles saved under {OUTPUT_DIR}/{{sp}}_{{horizon}}/{{z}}/{{x}}/{{y}}.png")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Export HSI maps as XYZ PNG tile pyramids."
+    )
+    parser.add_argument("--min-zoom", type=int, default=MIN_ZOOM)
+    parser.add_argument("--max-zoom", type=int, default=MAX_ZOOM)
+    parser.add_argument(
+        "--species", nargs="+", choices=species_list,
+        help="species to export (default: all)"
+    )
+    parser.add_argument(
+        "--horizons", nargs="+", choices=horizons,
+        help="horizons to export (default: all)"
+    )
+    args = parser.parse_args()
+
+    main(args.min_zoom, args.max_zoom, args.species, args.horizons)
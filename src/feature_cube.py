@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+
+# ==========================================
+# DENSE FEATURE CUBE (BARANGAY x DAY x FEATURE)
+# ==========================================
+#
+# Usage:
+#     python feature_cube.py [input.parquet]
+#
+# Built once from the model dataset the table path of
+# build_sequences_multi_horizon.py reads (its INPUT_PATH), per species:
+#
+#   cube_{sp}.npy    (barangays, days, features) float32, memory-mapped
+#   psgc_{sp}.npy    (barangays,)  int64, ascending
+#   dates_{sp}.npy   (days,)       datetime64[D], every day first..last
+#
+# Features are FEATURE_COLS of build_sequences_multi_horizon.py; days
+# with no row in the dataset are NaN. The cube is C-contiguous, so
+#
+#   cube.reshape(B * D, F)
+#
+# is a zero-copy base array for window_dataset.py, with the window of
+# barangay b starting at day t at row b * D + t. Downstream stages slice
+# it instead of re-reading and re-sorting the long table; windows that
+# touch a NaN day are skipped there.
+
+import os
+import sys
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+from build_sequences_multi_horizon import FEATURE_COLS, INPUT_PATH
+from table_io import iter_table_chunks
+
+CUBE_DIR = "data/feature_cube"
+
+
+def cube_extent(input_path):
+    """Pass 1: {species: (sorted psgc codes, first date, last date)}."""
+
+    extent = {}
+
+    for chunk in iter_table_chunks(
+        input_path, columns=["barangay_psgc", "species", "date"]
+    ):
+        for sp, part in chunk.groupby("species", sort=False, observed=True):
+
+            psgc = np.unique(part["barangay_psgc"].to_numpy(dtype=np.int64))
+            dates = part["date"].to_numpy(dtype="datetime64[D]")
+            first, last = dates.min(), dates.max()
+
+            if sp in extent:
+                old_psgc, old_first, old_last = extent[sp]
+                psgc = np.union1d(old_psgc, psgc)
+                first, last = min(first, old_first), max(last, old_last)
+
+            extent[sp] = (psgc, first, last)
+
+    return extent
+
+
+def build_cube(input_path=INPUT_PATH, output_dir=CUBE_DIR):
+    """Scatter the long table into one memory-mapped cube per species.
+
+    Two passes over the input, one chunk in memory at a time.
+    """
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    cubes = {}
+    for sp, (psgc, first, last) in cube_extent(input_path).items():
+
+        safe_name = sp.replace(" ", "_")
+        dates = np.arange(first, last + 1, dtype="datetime64[D]")
+
+        np.save(f"{output_dir}/psgc_{safe_name}.npy", psgc)
+        np.save(f"{output_dir}/dates_{safe_name}.npy", dates)
+
+        cube = open_memmap(
+            f"{output_dir}/cube_{safe_name}.npy",
+            mode="w+",
+            dtype=np.float32,
+            shape=(len(psgc), len(dates), len(FEATURE_COLS))
+        )
+        cube[:] = np.nan
+
+        cubes[sp] = (cube, psgc, first)
+
+    # Pass 2: scatter rows into their (barangay, day) cells
+    for chunk in iter_table_chunks(
+        input_path, columns=["barangay_psgc", "species", "date"] + FEATURE_COLS
+    ):
+        for sp, part in chunk.groupby("species", sort=False, observed=True):
+
+            cube, psgc, first = cubes[sp]
+
+            b = np.searchsorted(psgc, part["barangay_psgc"].to_numpy())
+            t = (part["date"].to_numpy(dtype="datetime64[D]") - first).astype(
+                np.int64
+            )
+
+            cube[b, t] = part[FEATURE_COLS].to_numpy(dtype=np.float32)
+
+    for sp, (cube, psgc, _) in cubes.items():
+        cube.flush()
+        print(f"  {sp}: cube {cube.shape}")
+
+    return list(cubes)
+
+
+def cube_species(cube_dir=CUBE_DIR):
+    """Safe names of the species with a cube in `cube_dir`."""
+
+    return sorted(
+        name[len("cube_"):-len(".npy")]
+        for name in os.listdir(cube_dir)
+        if name.startswith("cube_") and name.endswith(".npy")
+    )
+
+
+def load_cube(sp, cube_dir=CUBE_DIR):
+    """(cube, psgc, dates) of one species; the cube is memory-mapped."""
+
+    return (
+        np.load(f"{cube_dir}/cube_{sp}.npy", mmap_mode="r"),
+        np.load(f"{cube_dir}/psgc_{sp}.npy"),
+        np.load(f"{cube_dir}/dates_{sp}.npy")
+    )
+
+
+def cube_base(cube):
+    """(B * D, F) zero-copy view; row b * D + t is barangay b, day t."""
+
+    return cube.reshape(-1, cube.shape[2])
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) > 2:
+        print("Usage: python feature_cube.py [input.parquet]")
+        sys.exit(1)
+
+    species = build_cube(*sys.argv[1:])
+
+    print(f"\nFeature cubes for {len(species)} species → {CUBE_DIR}")
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+gazetteer.py – offline geocoder built from the PSGC shapefiles
+
+Usage:
+    python gazetteer.py build PH_Adm4_BgySubMuns.shp
+        [--adm3 PH_Adm3_MuniCities.shp] [--adm2 PH_Adm2_ProvDists.shp]
+    python gazetteer.py query "Naval, Santa Rosa, Laguna, Philippines"
+
+`build` indexes barangay names (and municipality / province names when
+the Adm3 / Adm2 shapefiles are given) with a representative point for
+each, and saves the index to data/gazetteer.parquet. Queries need only
+that file – no shapefile parsing, no network.
+
+Locations cleaned by clean_csv.py ("Barangay, Municipality, Province,
+Philippines") are matched part by part: exact normalized names first,
+then trigram similarity. The most specific unambiguous match wins; a
+barangay must sit inside a matched municipality or province unless its
+name is unique nationwide.
+"""
+
+import argparse
+import re
+import unicodedata
+from collections import Counter, defaultdict, namedtuple
+
+import pandas as pd
+
+INDEX_PATH = "data/gazetteer.parquet"
+
+LEVELS = ["province", "municipality", "barangay"]
+
+# Minimum trigram Jaccard similarity for a fuzzy name match
+MIN_SCORE = 0.75
+
+GENERIC_WORDS = {
+    "city", "of", "municipality", "province", "barangay", "brgy", "bgy"
+}
+
+SKIP_PARTS = {"philippines", "luzon", "visayas", "mindanao"}
+
+Match = namedtuple(
+    "Match", ["lat", "lon", "level", "name", "psgc", "adm4_psgc", "score"]
+)
+
+# ─────────────────────────────────────────────
+# NORMALIZATION
+# ─────────────────────────────────────────────
+def normalize_name(name):
+    """Lowercase ASCII words without punctuation or generic words."""
+    if not isinstance(name, str):
+        return ""
+
+    name = unicodedata.normalize("NFKD", name)
+    name = name.encode("ascii", "ignore").decode()
+    name = re.sub(r"\(.*?\)", " ", name)          # "(Pob.)" aliases
+    name = re.sub(r"[^a-z0-9 ]", " ", name.lower())
+
+    return " ".join(w for w in name.split() if w not in GENERIC_WORDS)
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+# ─────────────────────────────────────────────
+# BUILD
+# ─────────────────────────────────────────────
+def shapefile_entries(path, level, name_col, psgc_col, parent_cols):
+    import geopandas as gpd
+
+    gdf = gpd.read_file(path).to_crs("EPSG:4326")
+    points = gdf.geometry.representative_point()
+
+    entries = pd.DataFrame({
+        "level": level,
+        "name": gdf[name_col],
+        "psgc": gdf[psgc_col].astype("int64"),
+        "adm3_psgc": gdf["adm3_psgc"].astype("int64")
+        if "adm3_psgc" in parent_cols else pd.NA,
+        "adm2_psgc": gdf["adm2_psgc"].astype("int64")
+        if "adm2_psgc" in parent_cols else pd.NA,
+        "lat": points.y,
+        "lon": points.x
+    })
+
+    if level == "municipality":
+        entries["adm3_psgc"] = entries["psgc"]
+    if level == "province":
+        entries["adm2_psgc"] = entries["psgc"]
+
+    return entries
+
+
+def build_index(adm4_path, adm3_path=None, adm2_path=None):
+    parts = [
+        shapefile_entries(
+            adm4_path, "barangay", "adm4_en", "adm4_psgc",
+            ["adm3_psgc", "adm2_psgc"]
+        )
+    ]
+
+    if adm3_path:
+        parts.append(shapefile_entries(
+            adm3_path, "municipality", "adm3_en", "adm3_psgc", ["adm2_psgc"]
+        ))
+
+    if adm2_path:
+        parts.append(shapefile_entries(
+            adm2_path, "province", "adm2_en", "adm2_psgc", []
+        ))
+
+    entries = pd.concat(parts, ignore_index=True)
+    entries["key"] = entries["name"].map(normalize_name)
+    entries = entries[entries["key"] != ""]
+
+    for col in ["adm3_psgc", "adm2_psgc"]:
+        entries[col] = entries[col].astype("Int64")
+
+    return entries.reset_index(drop=True)
+
+# ─────────────────────────────────────────────
+# LOOKUP
+# ─────────────────────────────────────────────
+class Gazetteer:
+    def __init__(self, entries):
+        self.entries = entries.reset_index(drop=True)
+
+        self.level = self.entries["level"].to_numpy()
+        self.keys = self.entries["key"].to_numpy()
+        self.adm3 = self.entries["adm3_psgc"].to_numpy()
+        self.adm2 = self.entries["adm2_psgc"].to_numpy()
+
+        self.exact = defaultdict(list)
+        self.postings = defaultdict(list)
+        self.n_grams = []
+
+        for i, key in enumerate(self.keys):
+            self.exact[key].append(i)
+            grams = trigrams(key)
+            self.n_grams.append(len(grams))
+            for gram in grams:
+                self.postings[gram].append(i)
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        return cls(pd.read_parquet(path))
+
+    def lookup(self, text):
+        """{entry: score} for one normalized name (exact, else trigram)."""
+        if text in self.exact:
+            return {i: 1.0 for i in self.exact[text]}
+
+        grams = trigrams(text)
+        shared = Counter()
+        for gram in grams:
+            shared.update(self.postings.get(gram, ()))
+
+        found = {}
+        for i, n_shared in shared.items():
+            score = n_shared / (len(grams) + self.n_grams[i] - n_shared)
+            if score >= MIN_SCORE:
+                found[i] = score
+        return found
+
+    def match_parts(self, location):
+        """Per level: {entry: (score, part index)} over all location parts."""
+        matches = {level: {} for level in LEVELS}
+
+        for p, part in enumerate(location.split(",")):
+            text = normalize_name(part)
+            if not text or text.split()[0] in SKIP_PARTS or text.isdigit():
+                continue
+
+            for i, score in self.lookup(text).items():
+                level = self.level[i]
+                if score > matches[level].get(i, (0, None))[0]:
+                    matches[level][i] = (score, p)
+
+        return matches
+
+    @staticmethod
+    def best(candidates):
+        """The single best candidate, or None if tied / empty."""
+        if not candidates:
+            return None
+        ranked = sorted(candidates.items(), key=lambda kv: -kv[1][0])
+        if len(ranked) > 1 and ranked[1][1][0] == ranked[0][1][0]:
+            return None
+        return ranked[0]
+
+    def resolve(self, location):
+        """Most specific unambiguous Match for a cleaned location, or None."""
+        matches = self.match_parts(location)
+
+        province = self.best(matches["province"])
+
+        municipalities = matches["municipality"]
+        if province:
+            inside = {
+                i: v for i, v in municipalities.items()
+                if self.adm2[i] == self.adm2[province[0]]
+            }
+            municipalities = inside or municipalities
+        municipality = self.best(municipalities)
+
+        barangays = matches["barangay"]
+        if municipality:
+            used_part = municipality[1][1]
+            barangays = {
+                i: v for i, v in barangays.items()
+                if self.adm3[i] == self.adm3[municipality[0]]
+                and v[1] != used_part
+            }
+        elif province:
+            used_part = province[1][1]
+            barangays = {
+                i: v for i, v in barangays.items()
+                if self.adm2[i] == self.adm2[province[0]]
+                and v[1] != used_part
+            }
+        barangay = self.best(barangays)
+
+        chosen = barangay or municipality or province
+        if chosen is None:
+            return None
+
+        i, (score, _) = chosen
+        row = self.entries.iloc[i]
+
+        return Match(
+            lat=float(row["lat"]),
+            lon=float(row["lon"]),
+            level=row["level"],
+            name=row["name"],
+            psgc=int(row["psgc"]),
+            adm4_psgc=int(row["psgc"]) if row["level"] == "barangay" else None,
+            score=score
+        )
+
+# ─────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline PSGC gazetteer.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build")
+    build.add_argument("adm4_shapefile")
+    build.add_argument("--adm3")
+    build.add_argument("--adm2")
+    build.add_argument("--output", default=INDEX_PATH)
+
+    query = sub.add_parser("query")
+    query.add_argument("location")
+    query.add_argument("--index", default=INDEX_PATH)
+
+    args = parser.parse_args()
+
+    if args.command == "build":
+        entries = build_index(args.adm4_shapefile, args.adm3, args.adm2)
+        entries.to_parquet(args.output, index=False)
+        print(f"✅ Indexed {len(entries)} names → {args.output}")
+        print(entries["level"].value_counts().to_string())
+    else:
+        print(Gazetteer.load(args.index).resolve(args.location))
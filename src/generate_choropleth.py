@@ -1,9 +1,10 @@
 import os
 import pandas as pd
-import geopandas as gpd
 import matplotlib.pyplot as plt
 from matplotlib.gridspec import GridSpec
 
+from map_geometry import cache_bounds, ensure_cache, level_for, load_level
+
 # ===============================
 # FILE PATHS
 # ===============================
@@ -19,8 +20,10 @@ os.makedirs(OUTPUT_FOLDER, exist_ok=True)
 # LOAD DATA
 # ===============================
 
-barangays = gpd.read_file(BARANGAY_SHP)
-country = gpd.read_file(COUNTRY_SHP)
+# Cached geometry, simplified to the 10 in / 300 DPI output
+ensure_cache(BARANGAY_SHP, COUNTRY_SHP)
+extent = cache_bounds()
+barangays, country = load_level(level_for((extent[2] - extent[0]) / (10 * 300)))
 hsi_df = pd.read_csv(HSI_CSV)
 
 barangays["adm4_psgc"] = barangays["adm4_psgc"].astype(int)
@@ -1,14 +1,41 @@
 # ==========================================
 # GENERATE HSI FOR 1-DAY AND 7-DAY MODELS
 # ==========================================
+#
+# Writes, per species and horizon:
+#
+#   outputs_multi/{sp}_{horizon}_HSI.csv   mean HSI per barangay (maps)
+#   outputs_multi/daily_hsi/{sp}_{horizon}/ every (barangay, target date)
+#                                           prediction, see hsi_store.py
+#
+# --forecast-only skips the historical windows: per species it builds
+# just the last SEQ_LENGTH days of every barangay (from the feature cube
+# with --from-cube, else from the model dataset table), runs one batched
+# predict per horizon and writes the forward-looking HSI
+#
+#   outputs_multi/{sp}_{horizon}_forecast.csv   barangay, target date
+#                                               (last date + horizon)
+#
+# appended to the daily HSI store on the full-history scale.
 
+import argparse
 import numpy as np
 import pandas as pd
-import tensorflow as tf
 from sklearn.preprocessing import MinMaxScaler
 import os
 
-SEQ_LENGTH = 14
+from build_sequences_multi_horizon import (
+    FEATURE_COLS,
+    HORIZONS,
+    INPUT_PATH,
+    SEQ_LENGTH
+)
+from hsi_store import has_store, store_path, write_daily_hsi
+from table_io import column_max, read_table
+from train_multi_horizon import load_horizon_model
+from window_dataset import load_window_index
+
+OUTPUT_DIR = "outputs_multi"
 
 species_list = [
     "Naja_philippinensis",
@@ -18,101 +45,234 @@ species_list = [
 
 horizons = ["1day", "7day"]
 
-# Load full scaled dataset (needed to reconstruct barangay-date mapping)
-df = pd.read_csv("data/model_dataset.csv")
-df["date"] = pd.to_datetime(df["date"])
 
-os.makedirs("outputs_multi", exist_ok=True)
+def barangay_mean_predictions(index, y_pred):
+    """Mean predicted abundance per barangay.
 
-for sp in species_list:
-    for horizon in horizons:
+    `index` is the (barangay_psgc, target_date) array saved by the
+    sequence builder, aligned row-for-row with the predictions.
+    """
 
-        print(f"\nGenerating HSI for {sp} - {horizon}")
+    psgc, inverse = np.unique(index["barangay_psgc"], return_inverse=True)
 
-        # ----------------------------
-        # Load trained model
-        # ----------------------------
-        model = tf.keras.models.load_model(
-            f"models_multi/{sp}_{horizon}.keras"
-        )
+    sums = np.bincount(inverse, weights=y_pred, minlength=len(psgc))
+    counts = np.bincount(inverse, minlength=len(psgc))
 
-        # ----------------------------
-        # Load sequences
-        # ----------------------------
-        X = np.load(
-            f"data/sequence_multi/X_{sp}_{horizon}.npy"
-        )
+    return pd.DataFrame({
+        "barangay_psgc": psgc,
+        "predicted_abundance": (sums / counts).astype(np.float32)
+    })
 
-        # Predict abundance
-        y_pred = model.predict(X, batch_size=512)
-        y_pred = y_pred.flatten()
 
-        # ----------------------------
-        # Reconstruct barangay-date mapping
-        # ----------------------------
+def compute_hsi(barangay_mean):
+    """Min-max scale mean predicted abundance to HSI."""
 
-        sp_name_clean = sp.replace("_", " ")
-        sp_df = df[df["species"] == sp_name_clean].copy()
-        sp_df = sp_df.sort_values(["barangay_psgc", "date"])
+    # ----------------------------
+    # Convert to Habitat Suitability Index (HSI)
+    # ----------------------------
 
-        reconstructed = []
-        index_counter = 0
+    scaler = MinMaxScaler()
+    barangay_mean["HSI"] = scaler.fit_transform(
+        barangay_mean[["predicted_abundance"]]
+    )
 
-        horizon_days = 1 if horizon == "1day" else 7
+    return barangay_mean
 
-        for barangay, group in sp_df.groupby("barangay_psgc"):
 
-            group = group.sort_values("date").reset_index(drop=True)
+def save_hsi(barangay_mean, sp, horizon):
 
-            # valid prediction dates
-            target_dates = group["date"].iloc[
-                SEQ_LENGTH + horizon_days - 1:
-            ].values
+    path = f"{OUTPUT_DIR}/{sp}_{horizon}_HSI.csv"
 
-            n_preds = len(target_dates)
+    barangay_mean.to_csv(path, index=False)
 
-            preds = y_pred[index_counter:index_counter + n_preds]
+    print(f"Saved HSI file: {path}")
 
-            temp_df = pd.DataFrame({
-                "barangay_psgc": barangay,
-                "date": target_dates,
-                "predicted_abundance": preds
-            })
 
-            reconstructed.append(temp_df)
-            index_counter += n_preds
+def save_daily_hsi(index, y_pred, sp, horizon):
+    """Rewrite the daily HSI store (and its scale) from a full-history run.
 
-        pred_df = pd.concat(reconstructed, ignore_index=True)
+    `index` is the window index aligned row-for-row with `y_pred`.
+    """
 
-        # ----------------------------
-        # Aggregate predicted abundance per barangay
-        # ----------------------------
+    daily = pd.DataFrame({
+        "barangay_psgc": index["barangay_psgc"],
+        "target_date": index["target_date"],
+        "predicted_abundance": y_pred.astype(np.float32)
+    })
+    write_daily_hsi(daily, sp, horizon, replace=True)
 
-        barangay_mean = (
-            pred_df
-            .groupby("barangay_psgc")["predicted_abundance"]
-            .mean()
-            .reset_index()
-        )
+    print(f"Saved daily HSI: {store_path(sp, horizon)}")
+
+
+def latest_windows_from_table(input_path=INPUT_PATH):
+    """{sp: (psgc, last date, X)} of the last SEQ_LENGTH days per barangay.
 
-        # ----------------------------
-        # Convert to Habitat Suitability Index (HSI)
-        # ----------------------------
+    Only the rows of those days are read (date filter pushdown). X is
+    (barangays, SEQ_LENGTH, features) with NaN for missing days.
+    """
 
-        scaler = MinMaxScaler()
-        barangay_mean["HSI"] = scaler.fit_transform(
-            barangay_mean[["predicted_abundance"]]
+    last = column_max(input_path, "date")
+    first = last - pd.Timedelta(days=SEQ_LENGTH - 1)
+
+    df = read_table(
+        input_path,
+        columns=["barangay_psgc", "species", "date"] + FEATURE_COLS,
+        filters=[("date", ">=", first)]
+    )
+
+    windows = {}
+    for sp, sp_df in df.groupby("species", sort=False, observed=True):
+
+        psgc, b = np.unique(
+            sp_df["barangay_psgc"].to_numpy(dtype=np.int64),
+            return_inverse=True
         )
+        t = (sp_df["date"] - first).dt.days.to_numpy()
+
+        X = np.full((len(psgc), SEQ_LENGTH, len(FEATURE_COLS)), np.nan,
+                    dtype=np.float32)
+        X[b, t] = sp_df[FEATURE_COLS].to_numpy(dtype=np.float32)
+
+        windows[sp.replace(" ", "_")] = (psgc, last, X)
+
+    return windows
 
-        # ----------------------------
-        # Save output
-        # ----------------------------
 
-        barangay_mean.to_csv(
-            f"outputs_multi/{sp}_{horizon}_HSI.csv",
-            index=False
+def latest_windows_from_cube(species):
+    """Same as latest_windows_from_table, sliced from the feature cubes."""
+
+    from feature_cube import cube_species, load_cube
+
+    windows = {}
+    for sp in sorted(set(species) & set(cube_species())):
+        cube, psgc, dates = load_cube(sp)
+        windows[sp] = (
+            psgc,
+            pd.Timestamp(dates[-1]),
+            np.ascontiguousarray(cube[:, -SEQ_LENGTH:, :])
         )
 
-        print(f"Saved HSI file: outputs_multi/{sp}_{horizon}_HSI.csv")
+    return windows
+
+
+def forecast(from_cube=False, input_path=INPUT_PATH):
+    """Predict only the next target date of every horizon."""
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    if from_cube:
+        windows = latest_windows_from_cube(species_list)
+    else:
+        windows = latest_windows_from_table(input_path)
+
+    for sp in species_list:
+
+        if sp not in windows:
+            print(f"\nNo data for {sp}, skipped")
+            continue
+
+        psgc, last, X = windows[sp]
+
+        # Barangays with a gap in their last SEQ_LENGTH days can't be forecast
+        complete = ~np.isnan(X).any(axis=(1, 2))
+        psgc, X = psgc[complete], X[complete]
+
+        if len(psgc) == 0:
+            print(f"\nNo complete {SEQ_LENGTH}-day window for {sp}, skipped")
+            continue
+
+        for horizon in horizons:
+
+            target_date = last + pd.Timedelta(days=HORIZONS[horizon])
+
+            print(f"\nForecasting {sp} - {horizon}: "
+                  f"{len(psgc)} barangays, target {target_date.date()}")
+
+            model = load_horizon_model(sp, horizon)
+
+            y_pred = model.predict(X, batch_size=len(X)).flatten()
+
+            if not has_store(sp, horizon):
+                print("  No full-history HSI scale yet; "
+                      "HSI scaled on this forecast alone")
+
+            stored = write_daily_hsi(
+                pd.DataFrame({
+                    "barangay_psgc": psgc,
+                    "target_date": target_date,
+                    "predicted_abundance": y_pred.astype(np.float32)
+                }),
+                sp, horizon
+            )
+
+            path = f"{OUTPUT_DIR}/{sp}_{horizon}_forecast.csv"
+            stored[stored["target_date"] == target_date].to_csv(
+                path, index=False
+            )
+
+            print(f"Saved forecast: {path}")
+
+    print("\nDone forecasting.")
+
+
+def main():
+
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    for sp in species_list:
+        for horizon in horizons:
+
+            print(f"\nGenerating HSI for {sp} - {horizon}")
+
+            # ----------------------------
+            # Load trained model
+            # ----------------------------
+            model = load_horizon_model(sp, horizon)
+
+            # ----------------------------
+            # Load sequences and barangay-date index
+            # ----------------------------
+            X = np.load(
+                f"data/sequence_multi/X_{sp}_{horizon}.npy",
+                mmap_mode="r"
+            )
+            index = load_window_index(sp, horizon)
+
+            # Predict abundance
+            y_pred = model.predict(X, batch_size=512)
+            y_pred = y_pred.flatten()
+
+            save_daily_hsi(index, y_pred, sp, horizon)
+
+            barangay_mean = barangay_mean_predictions(index, y_pred)
+
+            save_hsi(compute_hsi(barangay_mean), sp, horizon)
+
+    print("\nDone generating all HSI files.")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Generate HSI from the trained multi-horizon models."
+    )
+    parser.add_argument(
+        "--forecast-only",
+        action="store_true",
+        help="predict only from the last window of every barangay"
+    )
+    parser.add_argument(
+        "--from-cube",
+        action="store_true",
+        help="with --forecast-only, read the windows from the feature cubes"
+    )
+    parser.add_argument(
+        "--input", default=INPUT_PATH,
+        help=f"with --forecast-only, the model dataset (default: {INPUT_PATH})"
+    )
+    args = parser.parse_args()
 
-print("\nDone generating all HSI files.")
\ No newline at end of file
+    if args.forecast_only:
+        forecast(args.from_cube, args.input)
+    else:
+        main()
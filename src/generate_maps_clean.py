@@ -1,19 +1,53 @@
-import geopandas as gpd
-import pandas as pd
-import matplotlib.pyplot as plt
+"""
+Usage:
+    python generate_maps_clean.py [--raster] [--workers N]
+        [--species SP ...] [--horizons H ...] [--date YYYY-MM-DD ...]
+
+Geometry comes from the map geometry cache (map_geometry.py), built on
+first use. Vector mode draws polygons simplified to the output pixel
+size; --raster colours a pre-rasterized barangay label image instead
+(one lookup per pixel, no polygon drawing).
+
+Geometry is loaded once in the parent; with --workers N the maps are
+rendered by a fork-based process pool that shares it copy-on-write.
+Each map's render time is printed as it finishes.
+
+--date maps the HSI of single target dates from the daily HSI store
+(hsi_store.py) instead of the all-dates mean, one map per date:
+final_maps_clean/{sp}_{horizon}_{date}_clean.png.
+"""
+
+import argparse
+import multiprocessing
 import os
+import time
 
-BARANGAY_SHP = "data/shapefiles/PH_Adm4_BgySubMuns/PH_Adm4_BgySubMuns.shp"
-COUNTRY_SHP = "data/shapefiles/PH_Adm0_Country/PH_Adm0_Country.shp"
-HSI_FOLDER = "outputs_multi"
-OUTPUT_FOLDER = "final_maps_clean"
+import matplotlib
+matplotlib.use("Agg")   # non-interactive; safe in forked workers
 
-os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
 
-barangays = gpd.read_file(BARANGAY_SHP)
-country = gpd.read_file(COUNTRY_SHP)
+from map_geometry import (
+    BARANGAY_SHP,
+    COUNTRY_SHP,
+    cache_bounds,
+    ensure_cache,
+    geographic_aspect,
+    hsi_image,
+    label_edges,
+    label_raster,
+    level_for,
+    load_level
+)
+from hsi_store import query
+
+HSI_FOLDER = "outputs_multi"
+OUTPUT_FOLDER = "final_maps_clean"
 
-barangays["adm4_psgc"] = barangays["adm4_psgc"].astype(str)
+FIGSIZE = (15, 20)   # good thesis size
+DPI = 400
 
 species_list = [
     "Naja_philippinensis",
@@ -23,73 +57,236 @@ species_list = [
 
 horizons = ["1day", "7day"]
 
-for sp in species_list:
-    for horizon in horizons:
 
-        print(f"Generating improved map for {sp} - {horizon}")
+def draw_vector(fig, ax, hsi):
 
-        hsi = pd.read_csv(f"{HSI_FOLDER}/{sp}_{horizon}_HSI.csv")
-        hsi["barangay_psgc"] = hsi["barangay_psgc"].astype(str)
+    extent = cache_bounds()
+    barangays, _ = load_level(
+        level_for((extent[2] - extent[0]) / (FIGSIZE[0] * DPI))
+    )
 
-        merged = barangays.merge(
-            hsi,
-            left_on="adm4_psgc",
-            right_on="barangay_psgc",
-            how="inner"
-        )
+    merged = barangays.merge(
+        hsi,
+        left_on="adm4_psgc",
+        right_on="barangay_psgc",
+        how="inner"
+    )
 
-        # Larger footprint figure
-        fig, ax = plt.subplots(figsize=(15, 20))   # good thesis size
+    merged.plot(
+        column="HSI",
+        cmap="plasma",
 
-        # light background to increase contrast
-        ax.set_facecolor("#ebebeb")
+        # Fixed scale across ALL maps
+        vmin=0,
+        vmax=1,
 
-        merged.plot(
-            column="HSI",
-            cmap="plasma",
+        # Polygon border contrast
+        linewidth=0.12,
+        edgecolor="#222222",
 
-            # Fixed scale across ALL maps
-            vmin=0,
-            vmax=1,
+        legend=True,
+        legend_kwds={
+            "label": "Habitat Suitability Index (HSI)",
+            "shrink": 0.6,
+            "pad": 0.01
+        },
+        ax=ax
+    )
 
-            # Polygon border contrast
-            linewidth=0.12,
-            edgecolor="#222222",
 
-            legend=True,
-            legend_kwds={
-                "label": "Habitat Suitability Index (HSI)",
-                "shrink": 0.6,
-                "pad": 0.01
-            },
-            ax=ax
-        )
+def draw_raster(fig, ax, hsi):
 
-        # Country outline
-        country.boundary.plot(
-            ax=ax,
-            linewidth=0.2,
-            edgecolor="black"
-        )
+    labels, psgc, extent = label_raster(DPI, FIGSIZE[0])
+    minx, miny, maxx, maxy = extent
 
-        ax.set_title(
-            f"{sp.replace('_',' ')} – {horizon.upper()} Habitat Suitability Forecast",
-            fontsize=12,
-            pad=8
-        )
+    image = hsi_image(labels, psgc, hsi)
+
+    cmap = plt.get_cmap("plasma").copy()
+    cmap.set_bad(alpha=0)   # no data: background shows through
+
+    im = ax.imshow(
+        np.ma.masked_invalid(image),
+        cmap=cmap,
+        vmin=0,
+        vmax=1,
+        extent=(minx, maxx, miny, maxy),
+        interpolation="nearest"
+    )
+
+    # Barangay borders, only where a barangay has a value
+    edges = label_edges(labels) & ~np.isnan(image)
+    overlay = np.zeros(edges.shape + (4,), dtype=np.float32)
+    overlay[edges] = (0.133, 0.133, 0.133, 1.0)   # #222222
 
-        ax.axis("off")
+    ax.imshow(
+        overlay,
+        extent=(minx, maxx, miny, maxy),
+        interpolation="nearest"
+    )
 
-        # Reduce whitespace margins
-        plt.subplots_adjust(left=0.01, right=0.99, top=0.97, bottom=0.01)
+    ax.set_aspect(geographic_aspect(extent))
 
-        plt.savefig(
-            f"{OUTPUT_FOLDER}/{sp}_{horizon}_clean.png",
-            dpi=400,
-            bbox_inches="tight",
-            pad_inches=0.05
+    fig.colorbar(
+        im,
+        ax=ax,
+        label="Habitat Suitability Index (HSI)",
+        shrink=0.6,
+        pad=0.01
+    )
+
+
+def load_hsi(sp, horizon, date=None):
+
+    if date is not None:
+        return query(
+            sp, horizon, start=date, end=date,
+            columns=["barangay_psgc", "HSI"]
         )
 
-        plt.close()
+    hsi = pd.read_csv(f"{HSI_FOLDER}/{sp}_{horizon}_HSI.csv")
+    hsi["barangay_psgc"] = hsi["barangay_psgc"].astype("int64")
+
+    return hsi
+
+
+def render_map(sp, horizon, raster=False, date=None):
+
+    hsi = load_hsi(sp, horizon, date)
+
+    # Larger footprint figure
+    fig, ax = plt.subplots(figsize=FIGSIZE)
+
+    # light background to increase contrast
+    ax.set_facecolor("#ebebeb")
+
+    if raster:
+        draw_raster(fig, ax, hsi)
+    else:
+        draw_vector(fig, ax, hsi)
+
+    # Country outline
+    extent = cache_bounds()
+    _, country = load_level(
+        level_for((extent[2] - extent[0]) / (FIGSIZE[0] * DPI))
+    )
+    country.boundary.plot(
+        ax=ax,
+        linewidth=0.2,
+        edgecolor="black"
+    )
+
+    title = f"{sp.replace('_',' ')} – {horizon.upper()} Habitat Suitability Forecast"
+    if date is not None:
+        title += f" ({date})"
+
+    ax.set_title(
+        title,
+        fontsize=12,
+        pad=8
+    )
+
+    ax.axis("off")
+
+    # Reduce whitespace margins
+    plt.subplots_adjust(left=0.01, right=0.99, top=0.97, bottom=0.01)
+
+    name = f"{sp}_{horizon}" if date is None else f"{sp}_{horizon}_{date}"
+
+    plt.savefig(
+        f"{OUTPUT_FOLDER}/{name}_clean.png",
+        dpi=DPI,
+        bbox_inches="tight",
+        pad_inches=0.05
+    )
+
+    plt.close(fig)
+
+
+def preload_geometry(raster=False):
+    """Load everything render_map needs before workers are forked."""
+
+    ensure_cache(BARANGAY_SHP, COUNTRY_SHP)
+
+    extent = cache_bounds()
+    load_level(level_for((extent[2] - extent[0]) / (FIGSIZE[0] * DPI)))
+
+    if raster:
+        label_raster(DPI, FIGSIZE[0])
+
+
+def render_job(job):
+
+    sp, horizon, raster, date = job
+
+    start = time.perf_counter()
+    render_map(sp, horizon, raster, date)
+
+    label = horizon if date is None else f"{horizon} {date}"
+
+    return sp, label, time.perf_counter() - start
+
+
+def main(raster=False, species=None, horizon_names=None, workers=1,
+         dates=None):
+
+    os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+
+    preload_geometry(raster)
+
+    jobs = [
+        (sp, horizon, raster, date)
+        for sp in (species or species_list)
+        for horizon in (horizon_names or horizons)
+        for date in (dates or [None])
+    ]
+
+    start = time.perf_counter()
+
+    if workers > 1 and "fork" in multiprocessing.get_all_start_methods():
+        pool = multiprocessing.get_context("fork").Pool(workers)
+        results = pool.imap_unordered(render_job, jobs)
+    else:
+        pool = None
+        results = map(render_job, jobs)
+
+    try:
+        for sp, horizon, seconds in results:
+            print(f"  {sp} - {horizon}: {seconds:.1f} s")
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+
+    print(f"Clean maps generated: {len(jobs)} in "
+          f"{time.perf_counter() - start:.1f} s.")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Render the HSI maps of every species and horizon."
+    )
+    parser.add_argument(
+        "--raster",
+        action="store_true",
+        help="colour a cached barangay label raster instead of polygons"
+    )
+    parser.add_argument(
+        "--species", nargs="+", choices=species_list,
+        help="species to render (default: all)"
+    )
+    parser.add_argument(
+        "--horizons", nargs="+", choices=horizons,
+        help="horizons to render (default: all)"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="rendering processes (default: 1)"
+    )
+    parser.add_argument(
+        "--date", nargs="+", dest="dates", metavar="YYYY-MM-DD",
+        help="map the HSI of these target dates (default: all-dates mean)"
+    )
+    args = parser.parse_args()
 
-print("Clean maps generated.")
\ No newline at end of file
+    main(args.raster, args.species, args.horizons, args.workers, args.dates)
@@ -4,13 +4,33 @@ geocode_csv.py (robust, terminal-only failure reporting)
 
 Usage:
     python geocode_csv.py input.csv output_geocoded.csv
+        [--nominatim-url HOST[:PORT]] [--workers N] [--delay SECONDS]
+        [--retry-failed] [--gazetteer INDEX] [--offline]
+
+Locations are first resolved offline against the PSGC gazetteer index
+(gazetteer.py build …) when it exists; only what it cannot place
+unambiguously goes to Nominatim.
+
+Results are kept in a persistent SQLite cache keyed on the normalized
+location string, so places seen in earlier runs are never queried
+again. Only unique cache misses hit the geocoder backend, concurrently
+up to --workers, throttled by a shared rate limiter.
+
+Point --nominatim-url at a local Nominatim instance to drop the public
+service's 1 request / 1.5 s policy (e.g. --workers 8 --delay 0).
 """
 
-import sys
+import argparse
+import os
+import re
+import sqlite3
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
 import pandas as pd
 from geopy.geocoders import Nominatim
-from geopy.exc import GeocoderTimedOut, GeocoderServiceError
 
 # ─────────────────────────────────────────────
 # CONFIG
@@ -23,77 +43,306 @@ USER_AGENT = "cobra-sdm-thesis-geocoder"
 REQUEST_DELAY = 1.5   # seconds (policy-safe)
 TIMEOUT_SEC = 5       # hard timeout
 
+CACHE_PATH = "data/geocode_cache.sqlite"
+GAZETTEER_PATH = "data/gazetteer.parquet"
+
 # ─────────────────────────────────────────────
-def safe_geocode(geolocator, query):
-    """Geocode once, fail fast, no retries."""
-    try:
-        return geolocator.geocode(query, timeout=TIMEOUT_SEC)
-    except (GeocoderTimedOut, GeocoderServiceError):
+def normalize_key(loc):
+    """Cache key: case- and whitespace-insensitive location string."""
+    return re.sub(r"\s+", " ", loc).strip().lower()
+
+# ─────────────────────────────────────────────
+class GeocodeCache:
+    """Persistent (key → lat, lon, source) store.
+
+    Failures are kept as NULL coordinates with source
+    "failed:<backend>,<backend>…", the backends that were tried.
+    """
+
+    def __init__(self, path=CACHE_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS geocodes ("
+            " key TEXT PRIMARY KEY,"
+            " lat REAL,"
+            " lon REAL,"
+            " source TEXT,"
+            " updated_at TEXT)"
+        )
+        self.conn.commit()
+
+    def get_many(self, keys):
+        found = {}
+        keys = list(keys)
+        # SQLite caps the number of bound parameters per statement
+        for i in range(0, len(keys), 500):
+            chunk = keys[i:i + 500]
+            rows = self.conn.execute(
+                "SELECT key, lat, lon, source FROM geocodes WHERE key IN (%s)"
+                % ",".join("?" * len(chunk)),
+                chunk
+            )
+            for key, lat, lon, source in rows:
+                found[key] = (lat, lon, source)
+        return found
+
+    def put_many(self, results, source):
+        now = datetime.now(timezone.utc).isoformat()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?, ?)",
+            [
+                (key, lat, lon, source, now)
+                for key, (lat, lon) in results.items()
+            ]
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+# ─────────────────────────────────────────────
+class RateLimiter:
+    """Thread-safe minimum interval between calls."""
+
+    def __init__(self, min_interval):
+        self.min_interval = min_interval
+        self.lock = threading.Lock()
+        self.next_time = 0.0
+
+    def wait(self):
+        if self.min_interval <= 0:
+            return
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_time - now
+            self.next_time = max(now, self.next_time) + self.min_interval
+        if delay > 0:
+            time.sleep(delay)
+
+# ─────────────────────────────────────────────
+class NominatimBackend:
+    """Public Nominatim, or a local instance when `domain` is given."""
+
+    name = "nominatim"
+
+    def __init__(self, domain=None, delay=REQUEST_DELAY, workers=1):
+        kwargs = {"user_agent": USER_AGENT}
+        if domain:
+            kwargs.update(domain=domain, scheme="http")
+        self.geolocator = Nominatim(**kwargs)
+        self.limiter = RateLimiter(delay)
+        self.workers = workers
+
+    def geocode(self, query):
+        self.limiter.wait()
+        result = safe_geocode(self.geolocator, query)
+        if result:
+            return result.latitude, result.longitude
         return None
-    except Exception:
+
+# ─────────────────────────────────────────────
+class GazetteerBackend:
+    """Offline lookup in the PSGC gazetteer index (see gazetteer.py)."""
+
+    name = "gazetteer"
+    workers = 1
+
+    def __init__(self, index_path=GAZETTEER_PATH):
+        from gazetteer import Gazetteer
+        self.gazetteer = Gazetteer.load(index_path)
+
+    def geocode(self, query):
+        match = self.gazetteer.resolve(query)
+        if match:
+            return match.lat, match.lon
         return None
 
 # ─────────────────────────────────────────────
-def main(input_csv, output_csv):
+def safe_geocode(geolocator, query):
+    """Geocode once, fail fast, no retries.
+
+    Only "no result" returns None; timeouts, rate limits (429) and other
+    service errors raise, so the caller can tell them apart.
+    """
+    return geolocator.geocode(query, timeout=TIMEOUT_SEC)
+
+# ─────────────────────────────────────────────
+def try_geocode(backend, query):
+    """(result, error): error is the exception message if the call raised."""
+    try:
+        return backend.geocode(query), None
+    except Exception as e:
+        return None, f"{type(e).__name__}: {e}"
+
+# ─────────────────────────────────────────────
+def failed_backends(source):
+    """Backends already tried for a cached failure."""
+    if source == "failed":
+        # Written before failures recorded their backends (Nominatim only)
+        return {NominatimBackend.name}
+    return set(source.split(":", 1)[1].split(","))
+
+# ─────────────────────────────────────────────
+def resolve(queries, backends, cache):
+    """Geocode {key: query} through the backends in order.
+
+    Each backend gets the keys the previous ones could not resolve.
+    Every result is written to the cache; failures record which
+    backends were tried, so a later run with another backend retries them.
+    Keys a backend raised on (timeout, rate limit, outage) are not cached
+    as failed and are tried again next run.
+
+    Returns (failed keys, {errored key: last error}).
+    """
+    pending = dict(queries)
+    errors = {}
+
+    for backend in backends:
+        if not pending:
+            break
+
+        print(f"  {backend.name}: {len(pending)} unique locations")
+
+        keys = list(pending)
+        with ThreadPoolExecutor(max_workers=backend.workers) as pool:
+            results = list(pool.map(
+                lambda query: try_geocode(backend, query),
+                (pending[k] for k in keys)
+            ))
+
+        resolved = {}
+        for key, (result, error) in zip(keys, results):
+            if result:
+                resolved[key] = result
+                errors.pop(key, None)
+            elif error:
+                errors[key] = error
+        cache.put_many(resolved, backend.name)
+
+        pending = {k: q for k, q in pending.items() if k not in resolved}
+
+    # Remember failures so later runs with the same backends skip them
+    # (see --retry-failed)
+    failed = {k: q for k, q in pending.items() if k not in errors}
+
+    tried = ",".join(backend.name for backend in backends)
+    cache.put_many({key: (None, None) for key in failed}, f"failed:{tried}")
+
+    return failed, errors
+
+# ─────────────────────────────────────────────
+def main(input_csv, output_csv, backends, retry_failed=False):
     df = pd.read_csv(input_csv)
 
     if LOCATION_COL not in df.columns:
         raise ValueError(f"Missing required column: '{LOCATION_COL}'")
 
-    geolocator = Nominatim(user_agent=USER_AGENT)
-
-    cache = {}
-    lat_list = []
-    lon_list = []
-    failed = []
+    cache = GeocodeCache()
 
     print("🌍 Geocoding started (safe mode)…")
 
-    for i, loc in enumerate(df[LOCATION_COL]):
-        if not isinstance(loc, str) or not loc.strip():
-            lat_list.append(None)
-            lon_list.append(None)
+    valid = df[LOCATION_COL].map(
+        lambda loc: isinstance(loc, str) and bool(loc.strip())
+    )
+    keys = df[LOCATION_COL].where(valid).map(
+        normalize_key, na_action="ignore"
+    )
+
+    # One query per unique key (first spelling seen)
+    spellings = pd.DataFrame({
+        "key": keys[valid],
+        "query": df.loc[valid, LOCATION_COL]
+    }).drop_duplicates("key", keep="first")
+    queries = dict(zip(spellings["key"], spellings["query"]))
+
+    # Failures are retried on request, or when a backend not yet tried
+    # for them is available (e.g. online after an --offline run)
+    names = {backend.name for backend in backends}
+    cached = {}
+    for key, (lat, lon, source) in cache.get_many(queries).items():
+        if lat is None and (
+            retry_failed or not names <= failed_backends(source)
+        ):
             continue
+        cached[key] = (lat, lon, source)
 
-        if loc in cache:
-            lat, lon = cache[loc]
-        else:
-            result = safe_geocode(geolocator, loc)
-            if result:
-                lat, lon = result.latitude, result.longitude
-            else:
-                lat, lon = None, None
-                failed.append(loc)
+    misses = {k: q for k, q in queries.items() if k not in cached}
 
-            cache[loc] = (lat, lon)
-            time.sleep(REQUEST_DELAY)
+    print(f"  Cache hits: {len(cached)} / {len(queries)} unique locations")
 
-        lat_list.append(lat)
-        lon_list.append(lon)
+    failed_keys, errors = resolve(misses, backends, cache)
 
-        if (i + 1) % 10 == 0:
-            print(f"  Processed {i + 1}/{len(df)}")
+    coords = cache.get_many(queries)
+    cache.close()
 
-    df[LAT_COL] = lat_list
-    df[LON_COL] = lon_list
+    df[LAT_COL] = keys.map(lambda k: coords.get(k, (None, None))[0])
+    df[LON_COL] = keys.map(lambda k: coords.get(k, (None, None))[1])
     df.to_csv(output_csv, index=False)
 
+    failed = sorted(
+        queries[k] for k, (lat, _, _) in coords.items() if lat is None
+    )
+
     # ── SUMMARY ───────────────────────────────
     print("\n✅ Geocoding complete")
     print(f"📍 Output file: {output_csv}")
     print(f"📊 Total rows: {len(df)}")
-    print(f"🧠 Cached unique locations: {len(cache)}")
-    print(f"⚠️ Failed geocodes: {len(failed)}")
+    print(f"🧠 Unique locations: {len(queries)} ({len(misses)} looked up)")
+    print(f"⚠️ Failed geocodes: {len(failed)} ({len(failed_keys)} new)")
+
+    print(f"🔁 Errors (not cached, retried next run): {len(errors)}")
 
     if failed:
         print("\n❌ Locations that failed to geocode:")
-        for loc in sorted(set(failed)):
+        for loc in failed:
             print(f"  - {loc}")
 
+    if errors:
+        print("\n🔁 Locations the geocoder errored on:")
+        for key, error in sorted(errors.items()):
+            print(f"  - {queries[key]} ({error})")
+
 # ─────────────────────────────────────────────
 if __name__ == "__main__":
-    if len(sys.argv) != 3:
-        print("Usage: python geocode_csv.py input.csv output_geocoded.csv")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(
+        description="Geocode the location column of a CSV."
+    )
+    parser.add_argument("input_csv")
+    parser.add_argument("output_csv")
+    parser.add_argument(
+        "--nominatim-url",
+        help="host[:port] of a local Nominatim instance"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="concurrent requests (default: 1)"
+    )
+    parser.add_argument(
+        "--delay", type=float, default=REQUEST_DELAY,
+        help=f"minimum seconds between requests (default: {REQUEST_DELAY})"
+    )
+    parser.add_argument(
+        "--retry-failed", action="store_true",
+        help="query again locations that failed in earlier runs"
+    )
+    parser.add_argument(
+        "--gazetteer", default=GAZETTEER_PATH,
+        help=f"offline gazetteer index, tried first if present "
+             f"(default: {GAZETTEER_PATH})"
+    )
+    parser.add_argument(
+        "--offline", action="store_true",
+        help="gazetteer only; never fall back to Nominatim"
+    )
+    args = parser.parse_args()
+
+    backends = []
+    if os.path.exists(args.gazetteer):
+        backends.append(GazetteerBackend(args.gazetteer))
+    if not args.offline:
+        backends.append(
+            NominatimBackend(args.nominatim_url, args.delay, args.workers)
+        )
 
-    main(sys.argv[1], sys.argv[2])
+    main(args.input_csv, args.output_csv, backends, args.retry_failed)
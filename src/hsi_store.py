@@ -0,0 +1,223 @@
+# ==========================================
+# TIME-RESOLVED DAILY HSI STORE
+# ==========================================
+#
+# Every prediction of generate_hsi_multi_horizon.py is kept, one row per
+# (barangay, target date), per species and horizon:
+#
+#   outputs_multi/daily_hsi/{sp}_{horizon}/year=YYYY/month=M/part-0.parquet
+#
+#   barangay_psgc, target_date, predicted_abundance, HSI, HSI_mean_7d
+#
+# Rows are sorted by (target_date, barangay_psgc), so a date-range query
+# reads only the matching month partitions and row groups, and a PSGC
+# filter is pushed down to the scan. HSI scales predicted abundance by
+# the min / max of the full-history run, saved in {sp}_{horizon}.json,
+# so days appended later (forecast runs) are on the same scale.
+#
+# HSI_mean_7d is the trailing ROLLING_DAYS-day mean HSI per barangay.
+# Appends compute it for the new days only, with the previous
+# ROLLING_DAYS - 1 days read back as context; the latest-N-days means
+# ({sp}_{horizon}_latest_7d.parquet) are refreshed after every write.
+
+import glob
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from table_io import (
+    column_max,
+    read_table,
+    write_month_partitions,
+    write_table
+)
+
+STORE_DIR = "outputs_multi/daily_hsi"
+
+ROLLING_DAYS = 7
+LATEST_DAYS = 7
+
+ROLLING_COL = f"HSI_mean_{ROLLING_DAYS}d"
+
+STORE_COLUMNS = [
+    "barangay_psgc",
+    "target_date",
+    "predicted_abundance",
+    "HSI",
+    ROLLING_COL
+]
+
+
+def store_path(sp, horizon):
+
+    return os.path.join(STORE_DIR, f"{sp}_{horizon}")
+
+
+def scale_path(sp, horizon):
+
+    return f"{store_path(sp, horizon)}.json"
+
+
+def latest_path(sp, horizon, n_days=LATEST_DAYS):
+
+    return f"{store_path(sp, horizon)}_latest_{n_days}d.parquet"
+
+
+def has_store(sp, horizon):
+
+    return os.path.exists(scale_path(sp, horizon))
+
+
+def load_scale(sp, horizon):
+
+    with open(scale_path(sp, horizon)) as f:
+        scale = json.load(f)
+
+    return scale["abundance_min"], scale["abundance_max"]
+
+
+def save_scale(sp, horizon, lo, hi):
+
+    os.makedirs(STORE_DIR, exist_ok=True)
+
+    with open(scale_path(sp, horizon), "w") as f:
+        json.dump({"abundance_min": lo, "abundance_max": hi}, f, indent=2)
+
+
+def scale_hsi(predicted, lo, hi):
+    """Min-max scaled abundance, clipped to [0, 1]."""
+
+    if hi <= lo:
+        return np.zeros(len(predicted), dtype=np.float32)
+
+    return np.clip((predicted - lo) / (hi - lo), 0, 1).astype(np.float32)
+
+
+def trailing_mean(df, window=ROLLING_DAYS, column="HSI"):
+    """Per-barangay mean of `column` over the last `window` calendar days.
+
+    Days without a row are skipped (the mean is over the days present).
+    Returns an array aligned with the rows of `df`.
+    """
+
+    _, b = np.unique(df["barangay_psgc"].to_numpy(), return_inverse=True)
+    days = df["target_date"].to_numpy(dtype="datetime64[D]")
+    t = (days - days.min()).astype(np.int64)
+
+    n_days = t.max() + 1
+    sums = np.zeros((b.max() + 1, n_days + 1))
+    counts = np.zeros((b.max() + 1, n_days + 1))
+
+    # Column 0 stays zero: cumulative sums start before the first day
+    np.add.at(sums, (b, t + 1), df[column].to_numpy(dtype=np.float64))
+    np.add.at(counts, (b, t + 1), 1)
+
+    sums = np.cumsum(sums, axis=1)
+    counts = np.cumsum(counts, axis=1)
+
+    lo = np.maximum(t + 1 - window, 0)
+
+    window_sum = sums[b, t + 1] - sums[b, lo]
+    window_count = counts[b, t + 1] - counts[b, lo]
+
+    return (window_sum / window_count).astype(np.float32)
+
+
+def query(sp, horizon, start=None, end=None, psgc=None, columns=None):
+    """Daily rows of one species / horizon, optionally restricted to a
+    target date range (inclusive) and a list of barangay PSGC codes."""
+
+    filters = []
+    if start is not None:
+        filters.append(("target_date", ">=", start))
+    if end is not None:
+        filters.append(("target_date", "<=", end))
+    if psgc is not None:
+        filters.append(("barangay_psgc", "in", [int(p) for p in psgc]))
+
+    root = store_path(sp, horizon)
+
+    if not glob.glob(os.path.join(root, "year=*", "month=*", "*.parquet")):
+        return pd.DataFrame(columns=columns or STORE_COLUMNS)
+
+    return read_table(root, columns=columns, filters=filters or None)
+
+
+def latest_means(sp, horizon, n_days=LATEST_DAYS):
+    """Mean abundance / HSI per barangay over the last `n_days` days."""
+
+    last = column_max(store_path(sp, horizon), "target_date")
+
+    df = query(
+        sp, horizon,
+        start=last - pd.Timedelta(days=n_days - 1),
+        columns=["barangay_psgc", "predicted_abundance", "HSI"]
+    )
+
+    return (
+        df.groupby("barangay_psgc", sort=True)[["predicted_abundance", "HSI"]]
+        .mean()
+        .reset_index()
+    )
+
+
+def write_daily_hsi(daily, sp, horizon, replace=False):
+    """Store (barangay_psgc, target_date, predicted_abundance) rows.
+
+    replace=True rewrites the store and refits the HSI scale on `daily`
+    (full-history run). Otherwise every stored day from the earliest
+    day in `daily` onward is replaced by `daily`, scaled with the saved
+    scale, and earlier days are kept.
+    """
+
+    root = store_path(sp, horizon)
+
+    daily = daily.sort_values(["target_date", "barangay_psgc"])
+    predicted = daily["predicted_abundance"].to_numpy(dtype=np.float64)
+    start = pd.Timestamp(daily["target_date"].min())
+
+    if replace or not has_store(sp, horizon):
+        shutil.rmtree(root, ignore_errors=True)
+        lo, hi = float(predicted.min()), float(predicted.max())
+        save_scale(sp, horizon, lo, hi)
+        context = None
+    else:
+        lo, hi = load_scale(sp, horizon)
+        context = query(
+            sp, horizon,
+            start=start - pd.Timedelta(days=ROLLING_DAYS - 1),
+            end=start - pd.Timedelta(days=1),
+            columns=["barangay_psgc", "target_date", "HSI"]
+        )
+
+    daily = daily.assign(HSI=scale_hsi(predicted, lo, hi))
+
+    combined = pd.concat([context, daily], ignore_index=True)
+    combined[ROLLING_COL] = trailing_mean(combined)
+    new_rows = combined[combined["target_date"] >= start][STORE_COLUMNS]
+
+    if context is not None:
+        # Keep the days before `start` of the first rewritten month
+        kept = query(
+            sp, horizon,
+            start=start.replace(day=1),
+            end=start - pd.Timedelta(days=1)
+        )
+        new_rows = pd.concat([kept[STORE_COLUMNS], new_rows], ignore_index=True)
+
+        # Later months are replaced; drop partitions `daily` won't rewrite
+        for path in glob.glob(os.path.join(root, "year=*", "month=*")):
+            year = int(path.split("year=")[1].split(os.sep)[0])
+            month = int(path.split("month=")[1])
+            if (year, month) > (start.year, start.month):
+                shutil.rmtree(path)
+
+    write_month_partitions(new_rows, root, date_column="target_date")
+
+    write_table(latest_means(sp, horizon), latest_path(sp, horizon))
+
+    return new_rows
+
@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+
+"""
+Incremental refresh of the model dataset.
+
+Usage:
+    python incremental_refresh.py [--sequences]
+
+Instead of re-running clean_env_count.py -> build_model_dataset.py ->
+interpolation.py -> normalize_features.py over all years, each stage
+keeps a high-water mark (pipeline_state.py) and only processes dates
+after it, writing month partitions under data/incremental/<stage>/:
+
+    model_dataset_raw     counts + environmental join
+    model_dataset         imputation (with a lookback of already
+                          imputed days as context)
+    model_dataset_scaled  normalization with the saved feature scaler
+
+New environmental months come from the partitioned Parquet dataset
+written by `merge_csv.py --append --parquet data/env_parquet`; counts
+from poisson_redistribution.py (dense or sparse grid). The first run
+has no high-water marks and backfills everything.
+
+--sequences rebuilds the sequence arrays from the refreshed
+model_dataset afterwards (they are barangay-major, so new days cannot
+simply be appended to them).
+"""
+
+import argparse
+import os
+
+import pandas as pd
+
+from build_sequences_multi_horizon import SEQ_LENGTH
+from build_sequences_multi_horizon import main as build_sequences_main
+from interpolation import impute
+from normalize_features import (
+    SCALER_PARAMS_PATH,
+    feature_cols,
+    fit_scaler,
+    load_scaler,
+    save_scaler
+)
+from pipeline_state import get_high_water_mark, set_high_water_mark
+from sparse_grid import read_counts
+from table_io import column_max, read_table, write_month_partitions
+
+ENV_DATASET = "data/env_parquet"
+COUNTS_PATH = "data/redistributed_counts.parquet"
+STORE_DIR = "data/incremental"
+
+# Imputed days carried into the next refresh as interpolation context
+LOOKBACK_DAYS = SEQ_LENGTH
+
+env_cols = [
+    "adm4_psgc",
+    "date",
+    "air_temperature",
+    "soil_temperature",
+    "soil_moisture",
+    "LST_C",
+    "landcover"
+]
+
+
+def stage_path(stage):
+
+    return f"{STORE_DIR}/{stage}"
+
+
+def newer_than(hwm):
+
+    return [("date", ">", hwm)] if hwm is not None else None
+
+
+def append_stage(stage, new_rows, hwm):
+    """Write rows after `hwm` and advance the stage's high-water mark."""
+
+    root = stage_path(stage)
+
+    if hwm is not None:
+        new_rows = new_rows[new_rows["date"] > hwm]
+
+    if new_rows.empty:
+        print(f"  {stage}: nothing new")
+        return
+
+    # A partition is rewritten whole, so keep the rows of the first
+    # touched month that were already written before this refresh.
+    if hwm is not None and os.path.isdir(root):
+        month_start = (hwm + pd.Timedelta(days=1)).replace(day=1)
+        kept = read_table(root, filters=[
+            ("date", ">=", month_start),
+            ("date", "<=", hwm)
+        ])
+        new_rows = pd.concat([kept, new_rows], ignore_index=True)
+
+    new_rows = new_rows.sort_values(
+        ["barangay_psgc", "species", "date"]
+    ).reset_index(drop=True)
+
+    write_month_partitions(new_rows, root)
+
+    end = new_rows["date"].max()
+    set_high_water_mark(stage, end)
+
+    print(f"  {stage}: written through {end.date()}")
+
+
+def refresh_join():
+
+    stage = "model_dataset_raw"
+    hwm = get_high_water_mark(stage)
+
+    env_end = column_max(ENV_DATASET, "date")
+
+    if hwm is not None and env_end <= hwm:
+        print(f"  {stage}: up to date ({hwm.date()})")
+        return
+
+    env = read_table(ENV_DATASET, columns=env_cols, filters=newer_than(hwm))
+    env = env.drop_duplicates(subset=["adm4_psgc", "date"])
+
+    start = None if hwm is None else hwm + pd.Timedelta(days=1)
+    counts = read_counts(COUNTS_PATH, start_date=start, end_date=env_end)
+    counts = counts.drop_duplicates(
+        subset=["barangay_psgc", "species", "date"]
+    )
+
+    df = counts.merge(
+        env,
+        left_on=["barangay_psgc", "date"],
+        right_on=["adm4_psgc", "date"],
+        how="left"
+    ).drop(columns=["adm4_psgc"])
+
+    append_stage(stage, df, hwm)
+
+
+def refresh_imputation():
+
+    stage = "model_dataset"
+    hwm = get_high_water_mark(stage)
+    source_end = get_high_water_mark("model_dataset_raw")
+
+    if source_end is None or (hwm is not None and source_end <= hwm):
+        print(f"  {stage}: up to date")
+        return
+
+    df = read_table(stage_path("model_dataset_raw"), filters=newer_than(hwm))
+
+    if hwm is not None:
+        # Already imputed days give ffill / interpolation a starting point
+        context = read_table(stage_path(stage), filters=[
+            ("date", ">", hwm - pd.Timedelta(days=LOOKBACK_DAYS))
+        ])
+        df = pd.concat([context, df], ignore_index=True)
+
+    append_stage(stage, impute(df), hwm)
+
+
+def refresh_scaling():
+
+    stage = "model_dataset_scaled"
+    hwm = get_high_water_mark(stage)
+    source_end = get_high_water_mark("model_dataset")
+
+    if source_end is None or (hwm is not None and source_end <= hwm):
+        print(f"  {stage}: up to date")
+        return
+
+    # New days are scaled with the scaler fitted on the full history;
+    # on a fresh tree that scaler is fitted here first
+    if os.path.exists(SCALER_PARAMS_PATH):
+        scaler = load_scaler()
+    else:
+        print(f"  {stage}: no saved scaler, fitting on the full history")
+        scaler = fit_scaler(stage_path("model_dataset"))
+        save_scaler(scaler)
+
+    df = read_table(stage_path("model_dataset"), filters=newer_than(hwm))
+    df[feature_cols] = scaler.transform(df[feature_cols])
+
+    append_stage(stage, df, hwm)
+
+
+def main(build_sequences=False):
+
+    print("Incremental refresh:")
+
+    refresh_join()
+    refresh_imputation()
+    refresh_scaling()
+
+    if build_sequences:
+        build_sequences_main(input_path=stage_path("model_dataset"))
+
+    print("\nDone.")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Process only the dates after each stage's high-water mark."
+    )
+    parser.add_argument(
+        "--sequences",
+        action="store_true",
+        help="rebuild sequence arrays from the refreshed model dataset"
+    )
+    args = parser.parse_args()
+
+    main(args.sequences)
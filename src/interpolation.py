@@ -2,12 +2,12 @@
 # STEP 4: SMART ENVIRONMENTAL IMPUTATION
 # ==========================================
 
-import pandas as pd
+import numpy as np
 
-df = pd.read_csv("data/raw/model_dataset_raw.csv")
-df["date"] = pd.to_datetime(df["date"])
+from table_io import read_table, write_table
 
-df = df.sort_values(["barangay_psgc", "date"])
+INPUT_PATH = "data/raw/model_dataset_raw.parquet"
+OUTPUT_PATH = "data/model_dataset.parquet"
 
 # ERA5 variables (continuous climate variables)
 era5_cols = [
@@ -22,42 +22,137 @@ lst_cols = ["LST_C"]
 # Landcover (quasi-static over short term)
 landcover_cols = ["landcover"]
 
-# ----------------------------
-# Interpolate ERA5
-# ----------------------------
 
-df[era5_cols] = (
-    df.groupby("barangay_psgc")[era5_cols]
-    .apply(lambda x: x.interpolate(method="linear"))
-    .reset_index(drop=True)
-)
+# Barangays densified per chunk: chunk x days x variables floats
+CHUNK_BARANGAYS = 1024
 
-# ----------------------------
-# Forward-fill LST
-# ----------------------------
 
-df[lst_cols] = (
-    df.groupby("barangay_psgc")[lst_cols]
-    .apply(lambda x: x.fillna(method="ffill"))
-    .reset_index(drop=True)
-)
+def last_valid_index(valid):
+    """Day index of the last valid value at or before each day (axis 1).
 
-# ----------------------------
-# Forward-fill landcover
-# ----------------------------
+    0 where there is none; the gathered value is then NaN as well.
+    """
 
-df[landcover_cols] = (
-    df.groupby("barangay_psgc")[landcover_cols]
-    .apply(lambda x: x.fillna(method="ffill"))
-    .reset_index(drop=True)
-)
+    days = np.arange(valid.shape[1]).reshape(1, -1, 1)
 
-# Final safety fill
-df = df.fillna(method="bfill")
+    return np.maximum.accumulate(np.where(valid, days, 0), axis=1)
 
-print("Remaining NaNs:")
-print(df.isna().sum())
 
-df.to_csv("data/model_dataset.csv", index=False)
+def next_valid_index(valid):
+    """Day index of the next valid value at or after each day (axis 1)."""
 
-print("Saved: data/model_dataset.csv")
\ No newline at end of file
+    n_days = valid.shape[1]
+    days = np.arange(n_days).reshape(1, -1, 1)
+
+    flipped = np.where(valid, days, n_days - 1)[:, ::-1]
+
+    return np.minimum.accumulate(flipped, axis=1)[:, ::-1]
+
+
+def ffill(grid):
+
+    prev = last_valid_index(~np.isnan(grid))
+
+    return np.take_along_axis(grid, prev, axis=1)
+
+
+def bfill(grid):
+
+    nxt = next_valid_index(~np.isnan(grid))
+
+    return np.take_along_axis(grid, nxt, axis=1)
+
+
+def interpolate_linear(grid):
+    """Per-series `interpolate(method="linear")` along axis 1.
+
+    Leading gaps stay NaN; trailing gaps take the last valid value.
+    """
+
+    valid = ~np.isnan(grid)
+    prev = last_valid_index(valid)
+    nxt = next_valid_index(valid)
+
+    lo = np.take_along_axis(grid, prev, axis=1)
+    hi = np.take_along_axis(grid, nxt, axis=1)
+
+    days = np.arange(grid.shape[1]).reshape(1, -1, 1)
+    span = np.maximum(nxt - prev, 1)
+
+    filled = (hi - lo) / span * (days - prev) + lo
+
+    return np.where(np.isnan(hi), lo, filled)
+
+
+def impute(df, chunk_barangays=CHUNK_BARANGAYS):
+    """Fill environmental gaps per barangay along the calendar.
+
+    Each chunk of barangays is scattered into a dense (barangay x date x
+    variable) array: ERA5 columns are interpolated linearly, LST and
+    landcover forward-filled, then any leading gap is back-filled within
+    the same barangay. Rows that share a (barangay, date) - one per
+    species - get the same values.
+    """
+
+    df = df.sort_values(["barangay_psgc", "date"], kind="stable")
+
+    if df.empty:
+        return df
+
+    env_cols = era5_cols + lst_cols + landcover_cols
+    n_era5 = len(era5_cols)
+
+    # Barangay codes ascend with the sort; dates become day offsets
+    _, b = np.unique(df["barangay_psgc"].to_numpy(), return_inverse=True)
+    d = (df["date"] - df["date"].min()).dt.days.to_numpy()
+    n_days = d.max() + 1
+
+    values = df[env_cols].to_numpy(dtype=np.float64)
+    filled = np.empty_like(values)
+
+    bounds = np.searchsorted(
+        b, np.arange(0, b[-1] + 1 + chunk_barangays, chunk_barangays)
+    )
+
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+
+        if lo == hi:
+            break
+
+        rb = b[lo:hi] - b[lo]
+        rd = d[lo:hi]
+        chunk = values[lo:hi]
+
+        grid = np.full((rb[-1] + 1, n_days, len(env_cols)), np.nan)
+
+        # Observed cells only, so a NaN duplicate never masks a value
+        rows, cols = np.nonzero(~np.isnan(chunk))
+        grid[rb[rows], rd[rows], cols] = chunk[rows, cols]
+
+        grid[:, :, :n_era5] = interpolate_linear(grid[:, :, :n_era5])
+        grid[:, :, n_era5:] = ffill(grid[:, :, n_era5:])
+
+        # Safety fill, within the barangay
+        grid = bfill(grid)
+
+        filled[lo:hi] = grid[rb, rd]
+
+    df[env_cols] = filled
+
+    return df
+
+
+def main():
+
+    df = impute(read_table(INPUT_PATH))
+
+    print("Remaining NaNs:")
+    print(df.isna().sum())
+
+    write_table(df, OUTPUT_PATH)
+
+    print(f"Saved: {OUTPUT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
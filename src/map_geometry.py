@@ -0,0 +1,248 @@
+# ==========================================
+# GEOMETRY CACHE FOR MAP RENDERING
+# ==========================================
+#
+# Built once from the Adm4 / Adm0 shapefiles into CACHE_DIR:
+#
+#   barangays_{level}.parquet   adm4_psgc + polygons (GeoParquet, EPSG:4326)
+#   country_{level}.parquet     country outline
+#   labels_{key}.npy            int32 raster: 0 = no barangay, i = row i-1
+#   labels_{key}.json           of the level-0 barangays table; extent, size
+#
+# Level 0 is full resolution; the others are simplified with tolerances
+# of TOLERANCES degrees. Barangays are simplified as a coverage (shared
+# edges stay shared, no slivers) where geopandas supports it.
+#
+# A map at a given DPI / extent uses the coarsest level whose tolerance
+# is at most half a pixel, so the simplification is invisible. Raster
+# maps skip polygons altogether: the label image is a lookup table away
+# from an HSI image. Everything is rebuilt when a shapefile changes.
+
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+import pandas as pd
+
+BARANGAY_SHP = "data/shapefiles/PH_Adm4_BgySubMuns/PH_Adm4_BgySubMuns.shp"
+COUNTRY_SHP = "data/shapefiles/PH_Adm0_Country/PH_Adm0_Country.shp"
+
+CACHE_DIR = "data/map_cache"
+
+# Simplification tolerances (degrees), level 1 upwards; ~50 m to ~7 km
+TOLERANCES = [0.0005, 0.002, 0.008, 0.032, 0.064]
+
+CRS = "EPSG:4326"
+
+_loaded = {}
+
+
+def cache_meta_path(cache_dir=CACHE_DIR):
+
+    return os.path.join(cache_dir, "meta.json")
+
+
+def source_mtimes(barangay_shp, country_shp):
+
+    return {
+        os.path.abspath(path): os.path.getmtime(path)
+        for path in (barangay_shp, country_shp)
+    }
+
+
+def cache_is_current(barangay_shp=BARANGAY_SHP, country_shp=COUNTRY_SHP,
+                     cache_dir=CACHE_DIR):
+
+    if not os.path.exists(cache_meta_path(cache_dir)):
+        return False
+
+    with open(cache_meta_path(cache_dir)) as f:
+        meta = json.load(f)
+
+    return (
+        meta["sources"] == source_mtimes(barangay_shp, country_shp)
+        and meta["tolerances"] == TOLERANCES
+    )
+
+
+def simplify_coverage(geoms, tolerance):
+
+    if hasattr(geoms, "simplify_coverage"):
+        return geoms.simplify_coverage(tolerance)
+
+    return geoms.simplify(tolerance, preserve_topology=True)
+
+
+def build_geometry_cache(barangay_shp=BARANGAY_SHP, country_shp=COUNTRY_SHP,
+                         cache_dir=CACHE_DIR):
+
+    import geopandas as gpd
+
+    os.makedirs(cache_dir, exist_ok=True)
+
+    # Stale label rasters index the old barangay table
+    for name in os.listdir(cache_dir):
+        if name.startswith("labels_"):
+            os.remove(os.path.join(cache_dir, name))
+
+    barangays = gpd.read_file(barangay_shp, columns=["adm4_psgc"]).to_crs(CRS)
+    barangays["adm4_psgc"] = barangays["adm4_psgc"].astype("int64")
+
+    country = gpd.read_file(country_shp).to_crs(CRS)[["geometry"]]
+
+    for level, tolerance in enumerate([0.0] + TOLERANCES):
+
+        if tolerance:
+            b = barangays.set_geometry(
+                simplify_coverage(barangays.geometry, tolerance)
+            )
+            c = country.set_geometry(
+                country.geometry.simplify(tolerance, preserve_topology=True)
+            )
+        else:
+            b, c = barangays, country
+
+        b.to_parquet(os.path.join(cache_dir, f"barangays_{level}.parquet"))
+        c.to_parquet(os.path.join(cache_dir, f"country_{level}.parquet"))
+
+        print(f"  level {level} (tolerance {tolerance}°) cached")
+
+    with open(cache_meta_path(cache_dir), "w") as f:
+        json.dump({
+            "sources": source_mtimes(barangay_shp, country_shp),
+            "tolerances": TOLERANCES,
+            "bounds": [float(v) for v in barangays.total_bounds]
+        }, f, indent=2)
+
+
+def ensure_cache(barangay_shp=BARANGAY_SHP, country_shp=COUNTRY_SHP,
+                 cache_dir=CACHE_DIR):
+
+    if not cache_is_current(barangay_shp, country_shp, cache_dir):
+        print("Building map geometry cache...")
+        build_geometry_cache(barangay_shp, country_shp, cache_dir)
+
+
+def level_for(pixel_size):
+    """Coarsest level whose tolerance is at most half a pixel."""
+
+    level = 0
+    for i, tolerance in enumerate(TOLERANCES, start=1):
+        if tolerance <= pixel_size / 2:
+            level = i
+
+    return level
+
+
+def load_level(level, cache_dir=CACHE_DIR):
+    """(barangays, country) GeoDataFrames of one level, cached per process."""
+
+    import geopandas as gpd
+
+    key = (cache_dir, level)
+
+    if key not in _loaded:
+        _loaded[key] = (
+            gpd.read_parquet(os.path.join(cache_dir, f"barangays_{level}.parquet")),
+            gpd.read_parquet(os.path.join(cache_dir, f"country_{level}.parquet"))
+        )
+
+    return _loaded[key]
+
+
+def cache_bounds(cache_dir=CACHE_DIR):
+
+    with open(cache_meta_path(cache_dir)) as f:
+        return tuple(json.load(f)["bounds"])
+
+
+def geographic_aspect(extent):
+    """y/x display scale of lon/lat axes (what geopandas uses for 4326)."""
+
+    mid_lat = (extent[1] + extent[3]) / 2
+
+    return 1 / math.cos(math.radians(mid_lat))
+
+
+def raster_shape(extent, width_px):
+
+    minx, miny, maxx, maxy = extent
+    aspect = geographic_aspect(extent)
+
+    height_px = round(width_px * (maxy - miny) / (maxx - minx) * aspect)
+
+    return height_px, width_px
+
+
+def label_raster(dpi, width_in, extent=None, cache_dir=CACHE_DIR):
+    """Barangay label image for a map `width_in` inches wide at `dpi`.
+
+    Returns (labels, psgc, extent): labels[r, c] is 0 outside every
+    barangay, else 1 + the row in `psgc` of the barangay covering that
+    pixel. Cached on disk per (dpi, width, extent).
+    """
+
+    if extent is None:
+        extent = cache_bounds(cache_dir)
+    extent = tuple(float(v) for v in extent)
+
+    height_px, width_px = raster_shape(extent, round(width_in * dpi))
+
+    key = hashlib.sha1(
+        json.dumps([dpi, width_in, extent]).encode()
+    ).hexdigest()[:12]
+    labels_path = os.path.join(cache_dir, f"labels_{key}.npy")
+
+    level = level_for((extent[2] - extent[0]) / width_px)
+    barangays, _ = load_level(level, cache_dir)
+    psgc = barangays["adm4_psgc"].to_numpy()
+
+    if not os.path.exists(labels_path):
+
+        from rasterio.features import rasterize
+        from rasterio.transform import from_bounds
+
+        labels = rasterize(
+            zip(barangays.geometry, np.arange(1, len(barangays) + 1)),
+            out_shape=(height_px, width_px),
+            transform=from_bounds(*extent, width_px, height_px),
+            fill=0,
+            dtype="int32"
+        )
+
+        np.save(labels_path, labels)
+
+        with open(os.path.join(cache_dir, f"labels_{key}.json"), "w") as f:
+            json.dump({
+                "dpi": dpi,
+                "width_in": width_in,
+                "extent": extent,
+                "level": level,
+                "shape": [height_px, width_px]
+            }, f, indent=2)
+
+    return np.load(labels_path, mmap_mode="r"), psgc, extent
+
+
+def hsi_image(labels, psgc, hsi):
+    """Float image of HSI per pixel (NaN where no barangay / no value)."""
+
+    lut = np.full(len(psgc) + 1, np.nan, dtype=np.float32)
+
+    rows = pd.Index(psgc).get_indexer(hsi["barangay_psgc"].astype("int64"))
+    found = rows >= 0
+    lut[rows[found] + 1] = hsi["HSI"].to_numpy(dtype=np.float32)[found]
+
+    return lut[labels]
+
+
+def label_edges(labels):
+    """Pixels on a barangay border (label differs from a neighbour)."""
+
+    edges = np.zeros(labels.shape, dtype=bool)
+    edges[:, 1:] |= labels[:, 1:] != labels[:, :-1]
+    edges[1:, :] |= labels[1:, :] != labels[:-1, :]
+
+    return edges & (np.asarray(labels) > 0)
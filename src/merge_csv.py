@@ -1,110 +1,200 @@
 #!/usr/bin/env python3
-import os
+"""
+Usage:
+    python merge_csv.py [--append] [--parquet OUTPUT_DIR]
+
+--append   only add monthly files not merged yet (see the manifest
+           written next to the output) instead of rewriting it
+--parquet  also write a Parquet dataset partitioned by year/month;
+           months whose partition already exists are skipped
+"""
+
+import argparse
 import glob
+import json
+import os
+import re
+import shutil
 import sys
 
+from table_io import read_table, write_table
+
 # ==========================================
 # CONFIGURATION (EDIT HERE)
 # ==========================================
 
-# Option 1: Explicit file list (in exact order you want)
-input_files = [
-    "data/env/Barangay_Daily_Env_2022_1.csv",
-    "data/env/Barangay_Daily_Env_2022_2.csv",
-    "data/env/Barangay_Daily_Env_2022_3.csv",
-    "data/env/Barangay_Daily_Env_2022_4.csv",
-    "data/env/Barangay_Daily_Env_2022_5.csv",
-    "data/env/Barangay_Daily_Env_2022_6.csv",
-    "data/env/Barangay_Daily_Env_2022_7.csv",
-    "data/env/Barangay_Daily_Env_2022_8.csv",
-    "data/env/Barangay_Daily_Env_2022_9.csv",
-    "data/env/Barangay_Daily_Env_2022_10.csv",
-    "data/env/Barangay_Daily_Env_2022_11.csv",
-    "data/env/Barangay_Daily_Env_2022_12.csv",
-    "data/env/Barangay_Daily_Env_2023_1.csv",
-    "data/env/Barangay_Daily_Env_2023_2.csv",
-    "data/env/Barangay_Daily_Env_2023_3.csv",
-    "data/env/Barangay_Daily_Env_2023_4.csv",
-    "data/env/Barangay_Daily_Env_2023_5.csv",
-    "data/env/Barangay_Daily_Env_2023_6.csv",
-    "data/env/Barangay_Daily_Env_2023_7.csv",
-    "data/env/Barangay_Daily_Env_2023_8.csv",
-    "data/env/Barangay_Daily_Env_2023_9.csv",
-    "data/env/Barangay_Daily_Env_2023_10.csv",
-    "data/env/Barangay_Daily_Env_2023_11.csv",
-    "data/env/Barangay_Daily_Env_2023_12.csv",
-    "data/env/Barangay_Daily_Env_2024_1.csv",
-    "data/env/Barangay_Daily_Env_2024_2.csv",
-    "data/env/Barangay_Daily_Env_2024_3.csv",
-    "data/env/Barangay_Daily_Env_2024_4.csv",
-    "data/env/Barangay_Daily_Env_2024_5.csv",
-    "data/env/Barangay_Daily_Env_2024_6.csv",
-    "data/env/Barangay_Daily_Env_2024_7.csv",
-    "data/env/Barangay_Daily_Env_2024_8.csv",
-    "data/env/Barangay_Daily_Env_2024_9.csv",
-    "data/env/Barangay_Daily_Env_2024_10.csv",
-    "data/env/Barangay_Daily_Env_2024_11.csv",
-    "data/env/Barangay_Daily_Env_2024_12.csv",
-    "data/env/Barangay_Daily_Env_2025_1.csv",
-    "data/env/Barangay_Daily_Env_2025_2.csv",
-    "data/env/Barangay_Daily_Env_2025_3.csv",
-    "data/env/Barangay_Daily_Env_2025_4.csv",
-    "data/env/Barangay_Daily_Env_2025_5.csv",
-    "data/env/Barangay_Daily_Env_2025_6.csv",
-    "data/env/Barangay_Daily_Env_2025_7.csv",
-    "data/env/Barangay_Daily_Env_2025_8.csv",
-    "data/env/Barangay_Daily_Env_2025_9.csv",
-    "data/env/Barangay_Daily_Env_2025_10.csv",
-    "data/env/Barangay_Daily_Env_2025_11.csv",
-    "data/env/Barangay_Daily_Env_2025_12.csv",
-    "data/env/Barangay_Daily_Env_2026_1.csv",
-]
-
-# Option 2: Folder mode (comment out input_files above if using this)
-# input_folder = "/path/to/folder_containing_csvs"
+# Monthly exports are discovered in this folder by name pattern
+input_folder = "data/env"
+file_glob = "Barangay_Daily_Env_*_*.csv"
+file_regex = re.compile(r"Barangay_Daily_Env_(\d{4})_(\d{1,2})\.csv$")
+
+# Optional: explicit file list (in exact order you want) overrides discovery
+input_files = []
 
 output_file = "data/environmental_data.csv"
 
+# Copy buffer size (bytes)
+BUFFER_SIZE = 16 * 1024 * 1024
+
 # ==========================================
 # DO NOT EDIT BELOW
 # ==========================================
 
+def file_month(path):
+    """(year, month) of a monthly export, or None if the name doesn't match."""
+
+    match = file_regex.search(os.path.basename(path))
+    if not match:
+        return None
+
+    return int(match.group(1)), int(match.group(2))
+
+
 def get_csv_files():
     if input_files:
         return input_files
 
-    # If using folder mode
-    if 'input_folder' in globals():
-        files = sorted(glob.glob(os.path.join(input_folder, "*.csv")))
-        return files
+    files = glob.glob(os.path.join(input_folder, file_glob))
+    files = [f for f in files if file_month(f) is not None]
 
-    print("No input files or folder defined.")
-    sys.exit(1)
+    # Numeric (year, month) order: 2022_2 before 2022_10
+    return sorted(files, key=file_month)
 
 
-def merge_csv(files, output_path):
-    if not files:
-        print("No files found.")
+def manifest_path(output_path):
+    return f"{output_path}.manifest.json"
+
+
+def load_manifest(output_path):
+    path = manifest_path(output_path)
+
+    if not os.path.exists(path):
+        return []
+
+    with open(path) as f:
+        return json.load(f)["files"]
+
+
+def save_manifest(output_path, files):
+    with open(manifest_path(output_path), "w") as f:
+        json.dump({"files": files}, f, indent=2)
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        return f.readline().rstrip(b"\r\n")
+
+
+def ends_with_newline(path):
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        if f.tell() == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+def validate_headers(files, expected=None):
+    """All files must share one header; returns it."""
+
+    if expected is None:
+        expected = read_header(files[0])
+
+    mismatched = [f for f in files if read_header(f) != expected]
+
+    if mismatched:
+        print("Header mismatch (expected: %s):" % expected.decode())
+        for f in mismatched:
+            print(" -", f, "->", read_header(f).decode())
         sys.exit(1)
 
-    print("Merging in this order:")
-    for f in files:
+    return expected
+
+
+def merge_csv(files, output_path, append=False):
+    merged = load_manifest(output_path) if append else []
+
+    if append and not os.path.exists(output_path):
+        merged = []
+
+    new_files = [f for f in files if f not in merged]
+
+    if not new_files:
+        print("No new files to merge.")
+        return
+
+    appending = bool(merged)
+
+    expected = read_header(output_path) if appending else None
+    validate_headers(new_files, expected)
+
+    print("Appending in this order:" if appending else "Merging in this order:")
+    for f in new_files:
         print(" -", f)
 
-    with open(output_path, "wb") as outfile:
-        for i, file_path in enumerate(files):
+    # Guard against an existing output missing its trailing newline
+    needs_newline = appending and not ends_with_newline(output_path)
+
+    with open(output_path, "ab" if appending else "wb") as outfile:
+        for i, file_path in enumerate(new_files):
+
+            if needs_newline:
+                outfile.write(b"\n")
+
             with open(file_path, "rb") as infile:
-                if i == 0:
-                    # Write entire first file (including header)
-                    outfile.write(infile.read())
-                else:
+                if i > 0 or appending:
                     # Skip first line (header) safely
                     infile.readline()
-                    outfile.write(infile.read())
+
+                # Stream in fixed-size chunks; never holds a whole file
+                shutil.copyfileobj(infile, outfile, BUFFER_SIZE)
+
+            needs_newline = not ends_with_newline(file_path)
+
+    save_manifest(output_path, merged + new_files)
 
     print(f"\nMerge complete → {output_path}")
 
 
+def write_parquet_partitions(files, output_dir):
+    """One Parquet partition per monthly file: year=YYYY/month=M/."""
+
+    for file_path in files:
+
+        month = file_month(file_path)
+        if month is None:
+            print(f"Skipping (no year/month in name): {file_path}")
+            continue
+
+        year, month = month
+        part_path = os.path.join(
+            output_dir, f"year={year}", f"month={month}", "part-0.parquet"
+        )
+
+        if os.path.exists(part_path):
+            continue
+
+        write_table(read_table(file_path), part_path)
+
+        print(f" + {part_path}")
+
+    print(f"\nParquet dataset → {output_dir}")
+
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Merge monthly environmental exports."
+    )
+    parser.add_argument("--append", action="store_true")
+    parser.add_argument("--parquet", metavar="OUTPUT_DIR")
+    args = parser.parse_args()
+
     files = get_csv_files()
-    merge_csv(files, output_file)
\ No newline at end of file
+    if not files:
+        print("No files found.")
+        sys.exit(1)
+
+    merge_csv(files, output_file, append=args.append)
+
+    if args.parquet:
+        write_parquet_partitions(files, args.parquet)
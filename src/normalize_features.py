@@ -1,13 +1,37 @@
 # ==========================================
 # STEP 5: NORMALIZE ENVIRONMENTAL FEATURES
 # ==========================================
+#
+# Usage:
+#     python normalize_features.py [--update NEW_DATA]
+#
+# Two passes over the model dataset, one chunk in memory at a time:
+# per-feature min/max via MinMaxScaler.partial_fit, then transform and
+# stream each chunk to the output.
+#
+# The fitted parameters are saved both as the joblib scaler and as a
+# small JSON file (feature_scaler.json) that any tool can read.
+#
+# --update NEW_DATA appends rows that are not in the scaled dataset yet
+# (e.g. newly arrived months): the saved min/max are widened with
+# NEW_DATA only - no first pass over the full history - and NEW_DATA is
+# scaled and appended to the output. If a range widened, the rows
+# already in the output are re-scaled to it on the way.
 
+import argparse
+import json
+
+import numpy as np
 import pandas as pd
 from sklearn.preprocessing import MinMaxScaler
 import joblib
 
-# Load model dataset
-df = pd.read_csv("data/model_dataset.csv")
+from table_io import iter_table_chunks, table_columns, write_table_chunks
+
+INPUT_PATH = "data/model_dataset.parquet"
+OUTPUT_PATH = "data/model_dataset_scaled.parquet"
+SCALER_PATH = "data/feature_scaler.save"
+SCALER_PARAMS_PATH = "data/feature_scaler.json"
 
 # Features to scale
 feature_cols = [
@@ -18,16 +42,130 @@ feature_cols = [
     "landcover"
 ]
 
-scaler = MinMaxScaler()
 
-df[feature_cols] = scaler.fit_transform(df[feature_cols])
+def fit_scaler(path, scaler=None):
+    """Pass 1: partial_fit a (new or existing) scaler over `path`."""
+
+    if scaler is None:
+        scaler = MinMaxScaler()
+
+    for chunk in iter_table_chunks(path, columns=feature_cols):
+        scaler.partial_fit(chunk[feature_cols])
+
+    return scaler
+
+
+def transform_dataset(scaler, input_path=INPUT_PATH, output_path=OUTPUT_PATH):
+    """Pass 2: scale `input_path` chunk by chunk into `output_path`."""
+
+    def scaled_chunks():
+        for chunk in iter_table_chunks(input_path):
+            chunk[feature_cols] = scaler.transform(chunk[feature_cols])
+            yield chunk
+
+    return write_table_chunks(scaled_chunks(), output_path)
+
+
+def save_scaler(scaler):
+
+    # Save scaler for later inference use
+    joblib.dump(scaler, SCALER_PATH)
+
+    with open(SCALER_PARAMS_PATH, "w") as f:
+        json.dump({
+            "feature_cols": feature_cols,
+            "data_min": scaler.data_min_.tolist(),
+            "data_max": scaler.data_max_.tolist(),
+            "n_samples_seen": int(np.max(scaler.n_samples_seen_))
+        }, f, indent=2)
+
+
+def load_scaler(path=SCALER_PARAMS_PATH):
+    """MinMaxScaler rebuilt from the portable JSON parameters."""
+
+    with open(path) as f:
+        params = json.load(f)
+
+    # Fitting the two extreme rows reproduces every fitted attribute
+    scaler = MinMaxScaler()
+    scaler.partial_fit(pd.DataFrame(
+        [params["data_min"], params["data_max"]],
+        columns=params["feature_cols"]
+    ))
+    scaler.n_samples_seen_ = params["n_samples_seen"]
+
+    return scaler
+
+
+def update_dataset(update_path, output_path=OUTPUT_PATH):
+    """Append the rows of `update_path`, scaled, to `output_path`.
+
+    The saved scaler is widened with the new rows only. If a feature
+    range changed, the rows already in `output_path` are mapped back
+    with the old scaler and re-scaled with the new one.
+    """
+
+    old_scaler = load_scaler()
+    scaler = fit_scaler(update_path, load_scaler())
+
+    rescale = not (
+        np.array_equal(old_scaler.data_min_, scaler.data_min_)
+        and np.array_equal(old_scaler.data_max_, scaler.data_max_)
+    )
+
+    save_scaler(scaler)
+
+    columns = table_columns(output_path)
+
+    def updated_chunks():
+        for chunk in iter_table_chunks(output_path, columns=columns):
+            if rescale:
+                chunk[feature_cols] = scaler.transform(pd.DataFrame(
+                    old_scaler.inverse_transform(chunk[feature_cols]),
+                    columns=feature_cols,
+                    index=chunk.index
+                ))
+            yield chunk
+        for chunk in iter_table_chunks(update_path, columns=columns):
+            chunk[feature_cols] = scaler.transform(chunk[feature_cols])
+            yield chunk
+
+    n_rows = write_table_chunks(updated_chunks(), output_path)
+
+    if rescale:
+        print("Feature ranges widened; existing rows re-scaled.")
+    else:
+        print("Feature ranges unchanged; existing rows kept as scaled.")
+
+    return n_rows
+
+
+def main(update_path=None):
+
+    if update_path is None:
+        scaler = fit_scaler(INPUT_PATH)
+        save_scaler(scaler)
+
+        # Save normalized dataset
+        n_rows = transform_dataset(scaler)
+    else:
+        n_rows = update_dataset(update_path)
+
+    print(f"Normalization complete ({n_rows} rows).")
+    print(f"Saved: {OUTPUT_PATH}")
+    print(f"Scaler saved: {SCALER_PATH}, {SCALER_PARAMS_PATH}")
+
 
-# Save scaler for later inference use
-joblib.dump(scaler, "data/feature_scaler.save")
+if __name__ == "__main__":
 
-# Save normalized dataset
-df.to_csv("data/model_dataset_scaled.csv", index=False)
+    parser = argparse.ArgumentParser(
+        description="Min-max scale the environmental features."
+    )
+    parser.add_argument(
+        "--update", metavar="NEW_DATA",
+        help="scale and append NEW_DATA (rows not in the scaled dataset "
+             "yet), widening the saved scaler instead of refitting"
+    )
+    args = parser.parse_args()
 
-print("Normalization complete.")
-print("Saved: data/model_dataset_scaled.csv")
-print("Scaler saved: data/feature_scaler.save")
\ No newline at end of file
+    main(args.update)
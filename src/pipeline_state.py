@@ -0,0 +1,43 @@
+# ==========================================
+# PIPELINE HIGH-WATER MARKS
+# ==========================================
+#
+# Last date each incremental stage has written, kept in a small JSON
+# file so a refresh only processes what is newer.
+
+import json
+import os
+
+import pandas as pd
+
+STATE_PATH = "data/pipeline_state.json"
+
+
+def load_state(path=STATE_PATH):
+
+    if not os.path.exists(path):
+        return {}
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def get_high_water_mark(stage, path=STATE_PATH):
+    """Last processed date of `stage` as a Timestamp, or None."""
+
+    value = load_state(path).get(stage)
+
+    return pd.Timestamp(value) if value else None
+
+
+def set_high_water_mark(stage, date, path=STATE_PATH):
+
+    state = load_state(path)
+    state[stage] = str(pd.Timestamp(date).date())
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
@@ -3,63 +3,185 @@
 """
 Usage:
     python poisson_redistribution.py input.csv
+
+A sparse grid (build_time_grid.py --sparse) is detected automatically;
+groups are then densified a chunk at a time and the output is written
+back as a sparse grid.
 """
 
 import sys
-import os
-import pandas as pd
+import zlib
+
 import numpy as np
+import pandas as pd
 
-OUTPUT_PATH = "data/redistributed_counts.csv"
+from sparse_grid import (
+    is_sparse_grid,
+    iter_dense_groups,
+    read_sparse_grid,
+    write_sparse_grid
+)
+from table_io import read_table, write_table
 
+OUTPUT_PATH = "data/redistributed_counts.parquet"
 
-def main(csv_path):
+WINDOW = 14
+SEED = 42
 
-    df = pd.read_csv(csv_path)
-    df["date"] = pd.to_datetime(df["date"])
 
-    required_cols = ["barangay_psgc", "species", "date", "count"]
-    for col in required_cols:
-        if col not in df.columns:
-            raise ValueError(f"Missing required column: {col}")
+def grouped_centered_mean(counts, group_ids, window=WINDOW):
+    """Centered rolling mean per contiguous group (cumulative-sum trick).
+
+    Matches `rolling(window, min_periods=1, center=True).mean()` applied
+    to each group: row i averages rows i - window//2 .. i + (window-1)//2
+    clipped to its own group.
+    """
+
+    n = len(counts)
+    pos = np.arange(n)
+
+    # First and last row of each row's group
+    new_group = np.concatenate([[True], group_ids[1:] != group_ids[:-1]])
+    group_first = np.maximum.accumulate(np.where(new_group, pos, 0))
+    last_group = np.concatenate([new_group[1:], [True]])
+    group_last = np.minimum.accumulate(
+        np.where(last_group, pos, n - 1)[::-1]
+    )[::-1]
+
+    lo = np.maximum(pos - window // 2, group_first)
+    hi = np.minimum(pos + (window - 1) // 2, group_last)
+
+    csum = np.concatenate([[0], np.cumsum(counts, dtype=np.int64)])
+
+    return (csum[hi + 1] - csum[lo]) / (hi - lo + 1)
+
+
+def group_rng(psgc, species, seed=SEED):
+    """Generator of one barangay x species group, keyed by the group itself.
+
+    Draws of a group do not depend on which other groups exist or on
+    their order, so adding a barangay or species leaves them unchanged.
+    """
+
+    return np.random.default_rng(
+        np.random.SeedSequence([seed, int(psgc), zlib.crc32(str(species).encode())])
+    )
+
+
+def fill_zero_days(counts, rolling_mean, psgc, species, seed=SEED):
+    """Poisson draws for the zero days of one group, in place."""
+
+    zero_days = counts == 0
+
+    if zero_days.any():
+        counts[zero_days] = group_rng(psgc, species, seed).poisson(
+            rolling_mean[zero_days]
+        )
+
+
+def redistribute(df, seed=SEED):
+    """Replace zero-count days with Poisson draws around the rolling mean.
+
+    Each barangay x species group draws from its own generator
+    (group_rng), so the result only depends on that group's data and
+    the seed; groups can be processed in any order or partition.
+    """
 
-    np.random.seed(42)
+    df = df.sort_values(
+        ["barangay_psgc", "species", "date"]
+    ).reset_index(drop=True)
 
-    new_counts = []
+    counts = df["count"].to_numpy(dtype=np.int64)
 
-    # Process each barangay × species independently
-    for (bgy, sp), group in df.groupby(["barangay_psgc", "species"]):
+    # One integer id per barangay x species group
+    group_ids = (
+        df.groupby(["barangay_psgc", "species"], observed=True, sort=False)
+        .ngroup()
+        .to_numpy()
+    )
 
-        group = group.sort_values("date").copy()
+    rolling_mean = grouped_centered_mean(counts, group_ids)
 
-        # Compute rolling mean (14-day window)
-        group["rolling_mean"] = (
-            group["count"]
-            .rolling(window=14, min_periods=1, center=True)
-            .mean()
+    # Keep observed sightings; apply Poisson only to zero days
+    new_counts = counts.copy()
+
+    bounds = np.concatenate([
+        [0], np.flatnonzero(group_ids[1:] != group_ids[:-1]) + 1, [len(df)]
+    ])
+    psgc = df["barangay_psgc"].to_numpy()
+    species = df["species"].to_numpy()
+
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        fill_zero_days(
+            new_counts[lo:hi], rolling_mean[lo:hi], psgc[lo], species[lo], seed
+        )
+
+    df["count"] = new_counts
+
+    return df[["barangay_psgc", "species", "date", "count"]]
+
+
+def redistribute_sparse(coo, n_days, seed=SEED):
+    """Sparse-grid version of redistribute(); returns new COO triples.
+
+    Groups are densified chunk by chunk and draw from the same per-group
+    generators as the dense path, so both paths give identical counts
+    for the same seed.
+    """
+
+    parts = []
+
+    for keys, counts in iter_dense_groups(coo, n_days):
+
+        flat = counts.ravel()
+        group_ids = np.repeat(np.arange(len(keys)), n_days)
+
+        rolling_mean = grouped_centered_mean(flat, group_ids).reshape(
+            counts.shape
         )
 
-        updated_counts = []
+        for i, (psgc, species) in enumerate(
+            zip(keys["barangay_psgc"], keys["species"])
+        ):
+            fill_zero_days(counts[i], rolling_mean[i], psgc, species, seed)
 
-        for _, row in group.iterrows():
+        g, d = np.nonzero(counts)
 
-            if row["count"] > 0:
-                # Keep observed sightings
-                updated_counts.append(row["count"])
-            else:
-                # Apply Poisson only to zero days
-                lam = row["rolling_mean"]
-                simulated = np.random.poisson(lam)
-                updated_counts.append(simulated)
+        part = keys.iloc[g].reset_index(drop=True)
+        part["date_offset"] = d.astype(np.int32)
+        part["count"] = counts[g, d]
 
-        group["count"] = updated_counts
+        parts.append(part)
+
+    if not parts:
+        return coo.iloc[:0]
+
+    return pd.concat(parts, ignore_index=True)
+
+
+def main(csv_path):
+
+    if is_sparse_grid(csv_path):
+
+        coo, dates = read_sparse_grid(csv_path)
+
+        write_sparse_grid(
+            redistribute_sparse(coo, len(dates)),
+            OUTPUT_PATH,
+            dates[0],
+            dates[-1]
+        )
+
+        print(f"Success. Sparse file saved to: {OUTPUT_PATH}")
+        return
+
+    required_cols = ["barangay_psgc", "species", "date", "count"]
 
-        new_counts.append(group[["barangay_psgc", "species", "date", "count"]])
+    df = read_table(csv_path, columns=required_cols)
 
-    final_df = pd.concat(new_counts)
+    final_df = redistribute(df)
 
-    os.makedirs("data", exist_ok=True)
-    final_df.to_csv(OUTPUT_PATH, index=False)
+    write_table(final_df, OUTPUT_PATH)
 
     print(f"Success. File saved to: {OUTPUT_PATH}")
 
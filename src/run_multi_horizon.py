@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+"""
+Single-pass driver: train, evaluate and generate HSI for every
+species and horizon in one process.
+
+Each species' base sequence array and window starts are loaded once,
+trained models stay in memory for evaluation and prediction (no .keras
+reload), and the metrics table and HSI outputs (mean HSI CSV and the
+daily HSI store, hsi_store.py) are written together.
+
+Usage:
+    python run_multi_horizon.py [--multi-output]
+
+--multi-output trains one model per species with a 1-day and a 7-day
+head sharing the Conv1D/LSTM trunk instead of one model per horizon.
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from build_sequences_multi_horizon import HORIZONS
+from generate_hsi_multi_horizon import (
+    OUTPUT_DIR,
+    barangay_mean_predictions,
+    compute_hsi,
+    save_daily_hsi,
+    save_hsi
+)
+from train_multi_horizon import (
+    BATCH_SIZE,
+    MODEL_DIR,
+    evaluate_model,
+    evaluate_predictions,
+    horizons,
+    species_list,
+    split_starts,
+    train_model
+)
+from window_dataset import (
+    load_sequence_base,
+    load_window_index,
+    load_window_starts,
+    make_window_dataset,
+    window_targets
+)
+
+METRICS_PATH = f"{OUTPUT_DIR}/evaluation_metrics.csv"
+
+
+def predict_starts(model, base, starts, horizon_days):
+
+    ds = make_window_dataset(
+        base, starts, horizon_days, BATCH_SIZE * 2, with_targets=False
+    )
+
+    return model.predict(ds, verbose=0)
+
+
+def run_per_horizon(sp, base, starts):
+    """One model per horizon; returns metric rows."""
+
+    rows = []
+
+    for horizon in horizons:
+
+        print(f"\n{sp} - {horizon}")
+
+        horizon_days = HORIZONS[horizon]
+
+        model, test_starts = train_model(base, starts[horizon], horizon_days)
+        model.save(f"{MODEL_DIR}/{sp}_{horizon}.keras")
+
+        mae, rmse = evaluate_model(model, base, test_starts, horizon_days)
+        rows.append([sp, horizon, mae, rmse])
+
+        print("MAE:", mae)
+        print("RMSE:", rmse)
+
+        y_pred = predict_starts(
+            model, base, starts[horizon], horizon_days
+        ).flatten()
+
+        index = load_window_index(sp, horizon)
+
+        save_daily_hsi(index, y_pred, sp, horizon)
+
+        barangay_mean = barangay_mean_predictions(index, y_pred)
+        save_hsi(compute_hsi(barangay_mean), sp, horizon)
+
+    return rows
+
+
+def run_multi_output(sp, base, starts):
+    """One shared-trunk model with a head per horizon; returns metric rows."""
+
+    print(f"\n{sp} - multi-output ({', '.join(horizons)})")
+
+    horizon_days = {horizon: HORIZONS[horizon] for horizon in horizons}
+
+    # The longest horizon has the fewest valid windows; those windows
+    # carry a target for every head.
+    longest = max(horizons, key=HORIZONS.get)
+
+    model, _ = train_model(
+        base, starts[longest], horizon_days, output_names=horizons
+    )
+    model.save(f"{MODEL_DIR}/{sp}_multi.keras")
+
+    # Single forward pass over the largest window set; every other
+    # horizon's windows are a subset of it (starts are sorted).
+    shortest = min(horizons, key=HORIZONS.get)
+    all_starts = starts[shortest]
+    y_all = predict_starts(model, base, all_starts, horizon_days)
+
+    rows = []
+
+    for horizon in horizons:
+
+        # Every head is tested after the training cut of the longest
+        # horizon (same split as test_metric.py)
+        _, _, test_starts = split_starts(
+            starts[horizon], split_on=starts[longest]
+        )
+        test_pos = np.searchsorted(all_starts, test_starts)
+
+        mae, rmse = evaluate_predictions(
+            window_targets(base, test_starts, HORIZONS[horizon]),
+            y_all[horizon][test_pos]
+        )
+        rows.append([sp, horizon, mae, rmse])
+
+        print(f"{horizon} MAE:", mae)
+        print(f"{horizon} RMSE:", rmse)
+
+        pos = np.searchsorted(all_starts, starts[horizon])
+        y_pred = y_all[horizon][pos].flatten()
+
+        index = load_window_index(sp, horizon)
+
+        save_daily_hsi(index, y_pred, sp, horizon)
+
+        barangay_mean = barangay_mean_predictions(index, y_pred)
+        save_hsi(compute_hsi(barangay_mean), sp, horizon)
+
+    return rows
+
+
+def main(multi_output):
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+
+    results = []
+
+    for sp in species_list:
+
+        base = load_sequence_base(sp)
+        starts = {
+            horizon: load_window_starts(sp, horizon)
+            for horizon in horizons
+        }
+
+        if multi_output:
+            results += run_multi_output(sp, base, starts)
+        else:
+            results += run_per_horizon(sp, base, starts)
+
+    df_results = pd.DataFrame(
+        results,
+        columns=["Species", "Forecast Horizon", "MAE", "RMSE"]
+    )
+
+    df_results.to_csv(METRICS_PATH, index=False)
+
+    print("\nFinal Evaluation Table:")
+    print(df_results)
+    print(f"\nMetrics saved to: {METRICS_PATH}")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(
+        description="Train, evaluate and generate HSI in one pass."
+    )
+    parser.add_argument(
+        "--multi-output",
+        action="store_true",
+        help="shared Conv1D/LSTM trunk with one head per horizon"
+    )
+    args = parser.parse_args()
+
+    main(args.multi_output)
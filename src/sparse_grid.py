@@ -0,0 +1,192 @@
+# ==========================================
+# SPARSE (COO) DAILY TIME GRID
+# ==========================================
+#
+# The dense grid (every barangay x species x day) is >99% zeros. In
+# sparse mode only the non-zero cells are stored as COO triples:
+#
+#   barangay_psgc, species, date_offset, count
+#
+# where date_offset is the day index from the grid start. The grid's
+# date range is stored in a JSON sidecar next to the table
+# (<path>.json), so the implicit zeros can be restored on demand.
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from table_io import read_table, table_columns, write_table
+
+SPARSE_COLUMNS = ["barangay_psgc", "species", "date_offset", "count"]
+
+
+def is_sparse_grid(path):
+
+    return "date_offset" in table_columns(path)
+
+
+def grid_dates(start_date, end_date):
+
+    return pd.date_range(start=start_date, end=end_date, freq="D")
+
+
+def to_sparse(df, start_date):
+    """COO triples of the non-zero counts of a long (date-based) table."""
+
+    df = df[df["count"] != 0]
+
+    offsets = (df["date"] - pd.Timestamp(start_date)).dt.days
+
+    return pd.DataFrame({
+        "barangay_psgc": df["barangay_psgc"].to_numpy(),
+        "species": df["species"].to_numpy(),
+        "date_offset": offsets.to_numpy(dtype=np.int32),
+        "count": df["count"].to_numpy()
+    }).sort_values(["barangay_psgc", "species", "date_offset"])
+
+
+def write_sparse_grid(coo, path, start_date, end_date):
+
+    write_table(coo[SPARSE_COLUMNS], path)
+
+    with open(f"{path}.json", "w") as f:
+        json.dump({
+            "start_date": str(pd.Timestamp(start_date).date()),
+            "end_date": str(pd.Timestamp(end_date).date())
+        }, f)
+
+
+def read_sparse_grid(path):
+    """Returns (coo, dates) where dates is the full grid date range."""
+
+    with open(f"{path}.json") as f:
+        meta = json.load(f)
+
+    coo = read_table(path, columns=SPARSE_COLUMNS)
+
+    return coo, grid_dates(meta["start_date"], meta["end_date"])
+
+
+def iter_dense_groups(coo, n_days, chunk_groups=4096):
+    """Densify the (barangay, species) groups of `coo`, a chunk at a time.
+
+    Yields (keys, counts) where keys is a DataFrame with one row per
+    group and counts is a (len(keys), n_days) array. Groups come in
+    (barangay_psgc, species) order, so at most `chunk_groups` dense rows
+    exist at once.
+    """
+
+    coo = coo.sort_values(
+        ["barangay_psgc", "species", "date_offset"]
+    ).reset_index(drop=True)
+
+    group_ids = (
+        coo.groupby(["barangay_psgc", "species"], observed=True, sort=False)
+        .ngroup()
+        .to_numpy()
+    )
+    n_groups = group_ids[-1] + 1 if len(group_ids) else 0
+
+    # Row range of each chunk of groups (rows are sorted by group)
+    bounds = np.searchsorted(
+        group_ids, np.arange(0, n_groups + chunk_groups, chunk_groups)
+    )
+
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+
+        if lo == hi:
+            break
+
+        chunk = coo.iloc[lo:hi]
+        ids = group_ids[lo:hi] - group_ids[lo]
+
+        first = np.concatenate([[True], ids[1:] != ids[:-1]])
+        keys = chunk.loc[first, ["barangay_psgc", "species"]]
+
+        counts = np.zeros((len(keys), n_days), dtype=np.int64)
+        counts[ids, chunk["date_offset"].to_numpy()] = chunk["count"].to_numpy()
+
+        yield keys.reset_index(drop=True), counts
+
+
+def densify(coo, dates, barangays=None, species_list=None):
+    """Long (barangay_psgc, species, date, count) table, zeros included.
+
+    Expands barangays x species x dates, by default for the barangays
+    and species present in `coo`. That is the same set of rows
+    build_time_grid.py writes in dense mode.
+    """
+
+    if barangays is None:
+        barangays = coo["barangay_psgc"].unique()
+    if species_list is None:
+        species_list = coo["species"].unique()
+
+    full_index = pd.MultiIndex.from_product(
+        [barangays, species_list, np.arange(len(dates), dtype=np.int32)],
+        names=["barangay_psgc", "species", "date_offset"]
+    )
+
+    full_df = pd.DataFrame(index=full_index).reset_index()
+
+    full_df = full_df.merge(
+        coo,
+        on=["barangay_psgc", "species", "date_offset"],
+        how="left"
+    )
+
+    full_df["count"] = full_df["count"].fillna(0).astype(int)
+    full_df["date"] = dates[full_df["date_offset"].to_numpy()]
+
+    return full_df[["barangay_psgc", "species", "date", "count"]]
+
+
+def read_counts(path, start_date=None, end_date=None, psgc_range=None):
+    """Long count table from either a dense or a sparse grid file.
+
+    `start_date` / `end_date` and `psgc_range` = (lo, hi) (all inclusive)
+    restrict the rows read; for a sparse grid only that part of the grid
+    is densified.
+    """
+
+    if is_sparse_grid(path):
+
+        coo, dates = read_sparse_grid(path)
+
+        lo = 0 if start_date is None else dates.searchsorted(
+            pd.Timestamp(start_date)
+        )
+        hi = len(dates) if end_date is None else dates.searchsorted(
+            pd.Timestamp(end_date), side="right"
+        )
+
+        # Expand the same barangays x species as the full grid would
+        barangays = coo["barangay_psgc"].unique()
+        species_list = coo["species"].unique()
+
+        if psgc_range is not None:
+            barangays = barangays[
+                (barangays >= psgc_range[0]) & (barangays <= psgc_range[1])
+            ]
+            coo = coo[coo["barangay_psgc"].isin(barangays)]
+
+        coo = coo[(coo["date_offset"] >= lo) & (coo["date_offset"] < hi)]
+        coo = coo.assign(date_offset=coo["date_offset"] - lo)
+
+        return densify(coo, dates[lo:hi], barangays, species_list)
+
+    filters = []
+    if start_date is not None:
+        filters.append(("date", ">=", start_date))
+    if end_date is not None:
+        filters.append(("date", "<=", end_date))
+    if psgc_range is not None:
+        filters.append(("barangay_psgc", ">=", psgc_range[0]))
+        filters.append(("barangay_psgc", "<=", psgc_range[1]))
+
+    return read_table(
+        path,
+        columns=["barangay_psgc", "species", "date", "count"],
+        filters=filters or None
+    )
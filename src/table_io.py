@@ -0,0 +1,319 @@
+# ==========================================
+# TYPED COLUMNAR STORAGE FOR INTERMEDIATE DATASETS
+# ==========================================
+#
+# read_table / write_table pick the format from the file extension:
+#
+#   .parquet  (default for pipeline intermediates)
+#   .feather
+#   .csv      (raw exports and anything a human opens in Excel)
+#   <dir>/    Parquet dataset partitioned as year=YYYY/month=M/
+#
+# Whatever the format, tables come back with the same dtypes, so stages
+# no longer re-parse dates or round-trip PSGC codes through float:
+#
+#   *_psgc   int64 (nullable Int64 if codes are missing)
+#   species  category (dictionary-encoded on disk)
+#   date     datetime64 in memory, date32 on disk (also target_date)
+#
+# Only the requested columns are read (projection pushdown for
+# Parquet/Feather, usecols for CSV).
+
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+PSGC_COLUMNS = [
+    "barangay_psgc",
+    "adm4_psgc",
+    "adm3_psgc",
+    "adm2_psgc",
+    "adm1_psgc"
+]
+
+CATEGORY_COLUMNS = ["species"]
+
+DATE_COLUMNS = ["date", "target_date"]
+
+PARTITION_COLUMNS = ["year", "month"]
+
+# Rows per chunk for iter_table_chunks
+CHUNK_ROWS = 1_000_000
+
+
+def table_format(path):
+
+    if os.path.isdir(path):
+        return "dataset"
+
+    ext = os.path.splitext(path)[1].lower()
+
+    if ext not in (".parquet", ".feather", ".csv"):
+        raise ValueError(f"Unsupported table format: {path}")
+
+    return ext[1:]
+
+
+def table_columns(path):
+    """Column names without reading any data."""
+
+    fmt = table_format(path)
+
+    if fmt == "parquet":
+        return pq.read_schema(path).names
+    if fmt == "dataset":
+        return [
+            name for name in partitioned_dataset(path).schema.names
+            if name not in PARTITION_COLUMNS
+        ]
+    if fmt == "feather":
+        return pa.ipc.open_file(path).schema.names
+
+    return list(pd.read_csv(path, nrows=0).columns)
+
+
+def normalize_types(df):
+    """Coerce PSGC, species and date columns to the pipeline schema."""
+
+    for col in PSGC_COLUMNS:
+        if col in df.columns and not pd.api.types.is_integer_dtype(df[col]):
+            # CSV exports often carry PSGC as float (e.g. 102802046.0)
+            codes = pd.to_numeric(df[col])
+            if codes.isna().any():
+                df[col] = codes.astype("Int64")
+            else:
+                df[col] = codes.astype("int64")
+
+    for col in CATEGORY_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+
+    for col in DATE_COLUMNS:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col])
+
+    return df
+
+
+def partitioned_dataset(path):
+
+    return ds.dataset(path, format="parquet", partitioning="hive")
+
+
+def apply_filters(df, filters):
+    """Apply [(column, op, value), ...] row filters to a DataFrame."""
+
+    ops = {
+        "==": lambda col, v: col == v,
+        "!=": lambda col, v: col != v,
+        "<": lambda col, v: col < v,
+        "<=": lambda col, v: col <= v,
+        ">": lambda col, v: col > v,
+        ">=": lambda col, v: col >= v
+    }
+
+    for col, op, value in filters:
+        if col in DATE_COLUMNS:
+            value = pd.Timestamp(value)
+        df = df[ops[op](df[col], value)]
+
+    return df
+
+
+def arrow_filters(filters):
+    """Filters with date values as datetime.date (matches date32)."""
+
+    return [
+        (col, op, pd.Timestamp(value).date() if col in DATE_COLUMNS else value)
+        for col, op, value in filters
+    ]
+
+
+def read_table(path, columns=None, filters=None):
+    """Read a table, optionally only `columns`, with normalized dtypes.
+
+    `filters` is a list of (column, op, value) tuples; Parquet files and
+    partitioned datasets skip non-matching row groups / partitions.
+    """
+
+    fmt = table_format(path)
+
+    if columns is not None:
+        available = set(table_columns(path))
+        for col in columns:
+            if col not in available:
+                raise ValueError(f"Missing required column: {col}")
+
+    if fmt in ("parquet", "dataset"):
+        if fmt == "dataset" and columns is None:
+            columns = table_columns(path)
+        df = pq.read_table(
+            path,
+            columns=columns,
+            filters=arrow_filters(filters) if filters else None,
+            partitioning="hive"
+        ).to_pandas(date_as_object=False)
+        filters = None
+    elif fmt == "feather":
+        df = feather.read_table(path, columns=columns).to_pandas(
+            date_as_object=False
+        )
+    else:
+        df = pd.read_csv(path, usecols=columns)
+
+    df = normalize_types(df)
+
+    if filters:
+        df = apply_filters(df, filters).reset_index(drop=True)
+
+    return df
+
+
+def iter_table_chunks(path, columns=None, chunk_rows=CHUNK_ROWS):
+    """Yield the table as DataFrames of at most `chunk_rows` rows.
+
+    Chunks are typed like read_table, so a whole table can be processed
+    in bounded memory.
+    """
+
+    fmt = table_format(path)
+
+    if fmt == "csv":
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=chunk_rows):
+            yield normalize_types(chunk)
+        return
+
+    if fmt == "feather":
+        dataset = ds.dataset(path, format="feather")
+    else:
+        dataset = ds.dataset(path, format="parquet", partitioning="hive")
+
+    for batch in dataset.to_batches(
+        columns=columns or table_columns(path), batch_size=chunk_rows
+    ):
+        if batch.num_rows:
+            yield normalize_types(batch.to_pandas(date_as_object=False))
+
+
+def column_max(path, column):
+    """Maximum of one column, from Parquet statistics when available."""
+
+    fmt = table_format(path)
+
+    if fmt in ("parquet", "dataset"):
+        if fmt == "dataset":
+            dataset = partitioned_dataset(path)
+        else:
+            dataset = ds.dataset(path, format="parquet")
+
+        values = []
+        for fragment in dataset.get_fragments():
+            metadata = fragment.metadata
+            index = metadata.schema.names.index(column)
+            for i in range(metadata.num_row_groups):
+                stats = metadata.row_group(i).column(index).statistics
+                if stats is None or not stats.has_min_max:
+                    return read_table(path, columns=[column])[column].max()
+                values.append(stats.max)
+        if not values:
+            return None
+        value = max(values)
+        return pd.Timestamp(value) if column in DATE_COLUMNS else value
+
+    return read_table(path, columns=[column])[column].max()
+
+
+def to_arrow(df):
+    """Arrow table with dates stored as date32."""
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+
+    for col in DATE_COLUMNS:
+        if col in table.column_names:
+            i = table.schema.get_field_index(col)
+            table = table.set_column(
+                i, col, table.column(col).cast(pa.date32())
+            )
+
+    return table
+
+
+def write_table(df, path):
+    """Write `df` in the format implied by the extension of `path`."""
+
+    fmt = table_format(path)
+
+    if fmt == "dataset":
+        raise ValueError(f"Use write_month_partitions for datasets: {path}")
+
+    df = normalize_types(df.copy())
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    if fmt == "csv":
+        df.to_csv(path, index=False)
+    elif fmt == "parquet":
+        pq.write_table(to_arrow(df), path)
+    else:
+        feather.write_feather(to_arrow(df), path)
+
+
+def write_table_chunks(chunks, path):
+    """Stream DataFrame chunks into one Parquet file; returns rows written.
+
+    Chunks go to a temporary file that replaces `path` only once all of
+    them are written. Nothing is written if there are no chunks.
+    """
+
+    if table_format(path) != "parquet":
+        raise ValueError(f"Chunked writes need a .parquet path: {path}")
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    tmp_path = f"{path}.tmp"
+    writer = None
+    n_rows = 0
+
+    try:
+        for df in chunks:
+            table = to_arrow(normalize_types(df.copy()))
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema)
+            writer.write_table(table.cast(writer.schema))
+            n_rows += len(df)
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if writer is not None:
+        os.replace(tmp_path, path)
+
+    return n_rows
+
+
+def month_partition_path(root, year, month):
+
+    return os.path.join(root, f"year={year}", f"month={month}", "part-0.parquet")
+
+
+def write_month_partitions(df, root, date_column="date"):
+    """Write `df` as a year=/month= partitioned Parquet dataset.
+
+    Every month present in `df` replaces that month's partition entirely;
+    other partitions under `root` are left untouched.
+    """
+
+    dates = pd.to_datetime(df[date_column])
+
+    for (year, month), part in df.groupby(
+        [dates.dt.year, dates.dt.month], sort=True
+    ):
+        write_table(part, month_partition_path(root, year, month))
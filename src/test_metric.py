@@ -1,8 +1,12 @@
-import numpy as np
 import pandas as pd
-import tensorflow as tf
-from sklearn.metrics import mean_absolute_error, mean_squared_error
-import os
+
+from build_sequences_multi_horizon import HORIZONS
+from train_multi_horizon import (
+    evaluate_model,
+    horizon_split_starts,
+    load_horizon_model
+)
+from window_dataset import load_sequence_base
 
 SEQ_LENGTH = 14
 
@@ -17,33 +21,27 @@ horizons = ["1day", "7day"]
 results = []
 
 for sp in species_list:
+
+    # Load base sequence array once per species
+    base = load_sequence_base(sp)
+
     for horizon in horizons:
-        
+
         print(f"\nEvaluating {sp} - {horizon}")
-        
-        # Load sequences
-        X = np.load(f"data/sequence_multi/X_{sp}_{horizon}.npy")
-        y = np.load(f"data/sequence_multi/y_{sp}_{horizon}.npy")
-        
+
         # Chronological split (same as training)
-        split_index = int(len(X) * 0.8)
-        X_test = X[split_index:]
-        y_test = y[split_index:]
-        
+        _, _, test_starts = horizon_split_starts(sp, horizon)
+
         # Load trained model
-        model = tf.keras.models.load_model(
-            f"models_multi/{sp}_{horizon}.keras"
+        model = load_horizon_model(sp, horizon)
+
+        # Predict and compute metrics
+        mae, rmse = evaluate_model(
+            model, base, test_starts, HORIZONS[horizon]
         )
-        
-        # Predict
-        y_pred = model.predict(X_test, verbose=0)
-        
-        # Compute metrics
-        mae = mean_absolute_error(y_test, y_pred)
-        rmse = np.sqrt(mean_squared_error(y_test, y_pred))
-        
+
         results.append([sp, horizon, mae, rmse])
-        
+
         print("MAE:", mae)
         print("RMSE:", rmse)
 
@@ -54,4 +52,4 @@ df_results = pd.DataFrame(
 )
 
 print("\nFinal Evaluation Table:")
-print(df_results)
\ No newline at end of file
+print(df_results)
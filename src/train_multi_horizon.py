@@ -2,14 +2,36 @@
 # TRAIN CNN-LSTM FOR 1-DAY AND 7-DAY
 # ==========================================
 
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+
 import numpy as np
+import pandas as pd
 import tensorflow as tf
 from sklearn.metrics import mean_absolute_error, mean_squared_error
-import os
+
+from build_sequences_multi_horizon import HORIZONS
+from window_dataset import (
+    load_sequence_base,
+    load_window_starts,
+    make_window_dataset,
+    window_targets
+)
 
 SEQ_LENGTH = 14
+N_FEATURES = 6
 EPOCHS = 10
 BATCH_SIZE = 256
+TEST_SPLIT = 0.2
+VALIDATION_SPLIT = 0.1
+SEED = 42
+
+MODEL_DIR = "models_multi"
+SUMMARY_PATH = f"{MODEL_DIR}/training_summary.csv"
 
 species_list = [
     "Naja_philippinensis",
@@ -19,53 +41,281 @@ species_list = [
 
 horizons = ["1day", "7day"]
 
-os.makedirs("models_multi", exist_ok=True)
 
-for sp in species_list:
-    for horizon in horizons:
+def build_model(output_names=None):
+    """CNN-LSTM regressor.
 
-        print(f"\nTraining {sp} - {horizon}")
+    With `output_names` the Conv1D/LSTM trunk is shared and one
+    Dense head is added per name (e.g. one per forecast horizon).
+    """
 
-        X = np.load(f"data/sequence_multi/X_{sp}_{horizon}.npy")
-        y = np.load(f"data/sequence_multi/y_{sp}_{horizon}.npy")
+    inputs = tf.keras.layers.Input(shape=(SEQ_LENGTH, N_FEATURES))
+    x = tf.keras.layers.Conv1D(32, 3, activation="relu")(inputs)
+    x = tf.keras.layers.MaxPooling1D(2)(x)
+    x = tf.keras.layers.LSTM(64)(x)
 
-        split_index = int(len(X) * 0.8)
+    if output_names is None:
+        x = tf.keras.layers.Dense(32, activation="relu")(x)
+        outputs = tf.keras.layers.Dense(1)(x)
+    else:
+        outputs = {
+            name: tf.keras.layers.Dense(1, name=name)(
+                tf.keras.layers.Dense(32, activation="relu")(x)
+            )
+            for name in output_names
+        }
 
-        X_train, X_test = X[:split_index], X[split_index:]
-        y_train, y_test = y[:split_index], y[split_index:]
+    model = tf.keras.Model(inputs, outputs)
 
-        model = tf.keras.Sequential([
-            tf.keras.layers.Input(shape=(SEQ_LENGTH, 6)),
-            tf.keras.layers.Conv1D(32, 3, activation="relu"),
-            tf.keras.layers.MaxPooling1D(2),
-            tf.keras.layers.LSTM(64),
-            tf.keras.layers.Dense(32, activation="relu"),
-            tf.keras.layers.Dense(1)
-        ])
+    model.compile(
+        optimizer="adam",
+        loss="mse",
+        metrics=["mae"] if output_names is None else {
+            name: ["mae"] for name in output_names
+        }
+    )
 
-        model.compile(
-            optimizer="adam",
-            loss="mse",
-            metrics=["mae"]
-        )
+    return model
+
+
+def uses_multi_output(sp, horizon):
+    """True if the latest saved model of `horizon` is {sp}_multi.keras."""
+
+    single = f"{MODEL_DIR}/{sp}_{horizon}.keras"
+    multi = f"{MODEL_DIR}/{sp}_multi.keras"
+
+    return os.path.exists(multi) and (
+        not os.path.exists(single)
+        or os.path.getmtime(multi) > os.path.getmtime(single)
+    )
+
+
+def load_horizon_model(sp, horizon):
+    """Saved model of one species / horizon.
+
+    Loads {sp}_{horizon}.keras, or the `horizon` head of a multi-output
+    {sp}_multi.keras (run_multi_horizon.py --multi-output), whichever
+    was saved last.
+    """
+
+    if uses_multi_output(sp, horizon):
+        model = tf.keras.models.load_model(f"{MODEL_DIR}/{sp}_multi.keras")
+        return tf.keras.Model(model.inputs, model.get_layer(horizon).output)
+
+    return tf.keras.models.load_model(f"{MODEL_DIR}/{sp}_{horizon}.keras")
+
+
+def split_starts(starts, split_on=None):
+    """Chronological train / validation / test split of window starts.
+
+    With `split_on` (the starts a multi-output model was trained on,
+    those of the longest horizon) `starts` is cut at the same start
+    rows, so no head is tested on a window before the training cut.
+    """
+
+    if split_on is None:
+        split_on = starts
 
-        model.fit(
-            X_train,
-            y_train,
-            epochs=EPOCHS,
-            batch_size=BATCH_SIZE,
-            validation_split=0.1,
-            verbose=1
+    split_index = int(len(split_on) * (1 - TEST_SPLIT))
+
+    # Same tail split Keras' validation_split would take
+    val_index = int(split_index * (1 - VALIDATION_SPLIT))
+
+    if split_on is not starts:
+        # First start row of the validation / test parts
+        bounds = np.append(split_on, np.iinfo(np.int64).max)
+        val_index, split_index = np.searchsorted(
+            starts, bounds[[val_index, split_index]]
         )
 
-        y_pred = model.predict(X_test)
+    return (
+        starts[:val_index],
+        starts[val_index:split_index],
+        starts[split_index:]
+    )
+
+
+def horizon_split_starts(sp, horizon, multi_output=None):
+    """split_starts of one horizon, as its saved model was trained.
+
+    A multi-output model's heads share the split of the longest
+    horizon's starts; `multi_output=None` checks which model is saved.
+    """
+
+    if multi_output is None:
+        multi_output = uses_multi_output(sp, horizon)
+
+    starts = load_window_starts(sp, horizon)
+
+    if not multi_output:
+        return split_starts(starts)
+
+    longest = max(horizons, key=HORIZONS.get)
+
+    return split_starts(starts, split_on=load_window_starts(sp, longest))
+
+
+def train_model(base, starts, horizon_days, output_names=None, seed=SEED):
+    """Fit a model on the training windows; returns (model, test_starts).
+
+    `horizon_days` is an int, or a {name: days} dict for a multi-output
+    model (then `starts` must be valid for the longest horizon).
+    """
+
+    train_starts, val_starts, test_starts = split_starts(starts)
+
+    train_ds = make_window_dataset(
+        base, train_starts, horizon_days, BATCH_SIZE,
+        shuffle=True, seed=seed
+    )
+    val_ds = make_window_dataset(
+        base, val_starts, horizon_days, BATCH_SIZE
+    )
+
+    model = build_model(output_names)
+
+    model.fit(
+        train_ds,
+        epochs=EPOCHS,
+        validation_data=val_ds,
+        verbose=1
+    )
+
+    return model, test_starts
+
+
+def evaluate_predictions(y_test, y_pred):
+    """MAE and RMSE of a set of predictions."""
+
+    mae = mean_absolute_error(y_test, y_pred)
+    rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+
+    return mae, rmse
+
+
+def evaluate_model(model, base, test_starts, horizon_days):
+
+    test_ds = make_window_dataset(
+        base, test_starts, horizon_days, BATCH_SIZE
+    )
+
+    y_test = window_targets(base, test_starts, horizon_days)
+    y_pred = model.predict(test_ds, verbose=0)
+
+    return evaluate_predictions(y_test, y_pred)
+
+
+def init_worker(intra_op_threads, inter_op_threads):
+    """Limit TensorFlow threads so parallel jobs do not oversubscribe."""
+
+    os.environ["OMP_NUM_THREADS"] = str(intra_op_threads)
+
+    tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+    tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+
+
+def train_job(job_id, sp, horizon):
+    """Train, evaluate and save one species x horizon model."""
+
+    # Seed depends only on the job, not on which worker runs it
+    seed = SEED + job_id
+    tf.keras.utils.set_random_seed(seed)
+
+    start_time = time.perf_counter()
+
+    print(f"\nTraining {sp} - {horizon}")
+
+    horizon_days = HORIZONS[horizon]
+
+    base = load_sequence_base(sp)
+    starts = load_window_starts(sp, horizon)
+
+    model, test_starts = train_model(base, starts, horizon_days, seed=seed)
+
+    mae, rmse = evaluate_model(model, base, test_starts, horizon_days)
+
+    print(f"{sp} - {horizon} MAE:", mae)
+    print(f"{sp} - {horizon} RMSE:", rmse)
+
+    model.save(f"{MODEL_DIR}/{sp}_{horizon}.keras")
+
+    return {
+        "Species": sp,
+        "Forecast Horizon": horizon,
+        "Seed": seed,
+        "MAE": mae,
+        "RMSE": rmse,
+        "Wall Time (s)": time.perf_counter() - start_time
+    }
+
+
+def main(workers=1, intra_op_threads=None, inter_op_threads=1):
+
+    os.makedirs(MODEL_DIR, exist_ok=True)
+
+    if intra_op_threads is None:
+        intra_op_threads = max(1, (os.cpu_count() or 1) // workers)
+
+    jobs = [
+        (job_id, sp, horizon)
+        for job_id, (sp, horizon) in enumerate(product(species_list, horizons))
+    ]
+
+    start_time = time.perf_counter()
+
+    if workers == 1:
+        init_worker(intra_op_threads, inter_op_threads)
+        results = [train_job(*job) for job in jobs]
+    else:
+        # spawn: TensorFlow is not fork-safe once initialized
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(intra_op_threads, inter_op_threads)
+        ) as pool:
+            results = list(pool.map(train_job, *zip(*jobs)))
+
+    summary = pd.DataFrame(results)
+    summary.to_csv(SUMMARY_PATH, index=False)
+
+    print("\nTraining Summary:")
+    print(summary.to_string(index=False))
+    print(
+        f"\n{len(jobs)} jobs on {workers} worker(s) "
+        f"({intra_op_threads} intra-op / {inter_op_threads} inter-op threads): "
+        f"{time.perf_counter() - start_time:.1f} s"
+    )
+    print(f"Summary saved to: {SUMMARY_PATH}")
+
+    print("\nDone training multi-horizon models.")
+
 
-        mae = mean_absolute_error(y_test, y_pred)
-        rmse = np.sqrt(mean_squared_error(y_test, y_pred))
+if __name__ == "__main__":
 
-        print(f"{sp} - {horizon} MAE:", mae)
-        print(f"{sp} - {horizon} RMSE:", rmse)
+    parser = argparse.ArgumentParser(
+        description="Train CNN-LSTM models for every species and horizon."
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="parallel training processes (default: 1)"
+    )
+    parser.add_argument(
+        "--intra-op-threads", type=int, default=None,
+        help="TensorFlow intra-op threads per worker "
+             "(default: CPU count / workers)"
+    )
+    parser.add_argument(
+        "--inter-op-threads", type=int, default=1,
+        help="TensorFlow inter-op threads per worker (default: 1)"
+    )
+    args = parser.parse_args()
 
-        model.save(f"models_multi/{sp}_{horizon}.keras")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
+    if args.intra_op_threads is not None and args.intra_op_threads < 1:
+        parser.error("--intra-op-threads must be at least 1")
+    if args.inter_op_threads < 1:
+        parser.error("--inter-op-threads must be at least 1")
 
-print("\nDone training multi-horizon models.")
\ No newline at end of file
+    main(args.workers, args.intra_op_threads, args.inter_op_threads)
@@ -0,0 +1,118 @@
+# ==========================================
+# LAZY WINDOW DATASET FOR MULTI-HORIZON MODELS
+# ==========================================
+#
+# Instead of loading the materialized X_*.npy tensors (one copy of every
+# overlapping 14-day window), training keeps only the compact base array
+# written by build_sequences_multi_horizon.py:
+#
+#   base_{sp}.npy          (rows, features)  sorted by barangay, date
+#                          (or a link to the species' feature cube)
+#   starts_{sp}_{h}.npy    (windows,)        row index of each window start
+#   index_{sp}_{h}.npy     (windows,)        (barangay_psgc, target_date)
+#
+# Windows are gathered per batch with index arithmetic:
+#   X = base[start : start + SEQ_LENGTH]
+#   y = base[start + SEQ_LENGTH + horizon_days - 1, 0]
+
+import numpy as np
+import tensorflow as tf
+
+from build_sequences_multi_horizon import (
+    FEATURE_COLS,
+    OUTPUT_DIR,
+    SEQ_LENGTH
+)
+
+
+def load_sequence_base(sp):
+    """Memory-map the base feature array of one species.
+
+    When base_{sp}.npy links to a feature cube, the cube is flattened to
+    (barangays * days, features) without copying.
+    """
+
+    base = np.load(f"{OUTPUT_DIR}/base_{sp}.npy", mmap_mode="r")
+
+    return base.reshape(-1, len(FEATURE_COLS))
+
+
+def load_window_starts(sp, horizon):
+
+    return np.load(f"{OUTPUT_DIR}/starts_{sp}_{horizon}.npy")
+
+
+def load_window_index(sp, horizon):
+    """Structured (barangay_psgc, target_date) array, one row per window."""
+
+    return np.load(f"{OUTPUT_DIR}/index_{sp}_{horizon}.npy")
+
+
+def window_targets(base, starts, horizon_days):
+    """Targets of the given windows as a NumPy array (for metrics).
+
+    With a {name: days} dict, returns a dict of target arrays.
+    """
+
+    if isinstance(horizon_days, dict):
+        return {
+            name: window_targets(base, starts, days)
+            for name, days in horizon_days.items()
+        }
+
+    return np.asarray(base[starts + SEQ_LENGTH + horizon_days - 1, 0])
+
+
+def make_window_dataset(
+    base,
+    starts,
+    horizon_days,
+    batch_size,
+    shuffle=False,
+    seed=None,
+    with_targets=True
+):
+    """tf.data pipeline yielding (X, y) batches generated on the fly.
+
+    `horizon_days` is an int, or a {name: days} dict for multi-output
+    models, in which case y is a dict of targets keyed by name. With
+    `with_targets=False` only X is yielded (prediction), so windows
+    without a target inside the base array are allowed.
+    """
+
+    base_t = tf.constant(np.asarray(base, dtype=np.float32))
+    offsets = tf.range(SEQ_LENGTH, dtype=tf.int64)
+
+    if isinstance(horizon_days, dict):
+        target_offsets = {
+            name: SEQ_LENGTH + days - 1
+            for name, days in horizon_days.items()
+        }
+    else:
+        target_offsets = SEQ_LENGTH + horizon_days - 1
+
+    ds = tf.data.Dataset.from_tensor_slices(starts.astype(np.int64))
+
+    if shuffle:
+        # Only int64 start indices sit in the buffer, so a full shuffle is cheap
+        ds = ds.shuffle(
+            len(starts),
+            seed=seed,
+            reshuffle_each_iteration=True
+        )
+
+    ds = ds.batch(batch_size)
+
+    def gather_windows(batch_starts):
+        X = tf.gather(base_t, batch_starts[:, None] + offsets)
+        if not with_targets:
+            return X
+        y = tf.nest.map_structure(
+            lambda offset: tf.gather(base_t[:, 0], batch_starts + offset),
+            target_offsets
+        )
+        return X, y
+
+    ds = ds.map(gather_windows, num_parallel_calls=tf.data.AUTOTUNE)
+
+    return ds.prefetch(tf.data.AUTOTUNE)
@@ -0,0 +1,74 @@
+import io
+import json
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+pytest.importorskip("geopandas")
+
+from assignment_service import iter_batches, serve_lines
+
+
+def test_burst_fills_batches():
+    """Lines written in one burst to an open pipe come out in full batches."""
+
+    read_fd, write_fd = os.pipe()
+    lines = "".join(
+        json.dumps({"i": i}) + "\n" for i in range(600)
+    ).encode()
+
+    def write_burst():
+        os.write(write_fd, lines)
+        time.sleep(1.0)   # keep the pipe open: batches must not wait for EOF
+        os.close(write_fd)
+
+    threading.Thread(target=write_burst, daemon=True).start()
+
+    start = time.perf_counter()
+    sizes = []
+    with os.fdopen(read_fd) as stream:
+        for batch in iter_batches(stream, batch_size=256, max_wait=0.2):
+            sizes.append((len(batch), time.perf_counter() - start))
+
+    assert [n for n, _ in sizes] == [256, 256, 88]
+
+    # Full batches are emitted right away, the remainder after max_wait
+    assert sizes[1][1] < 0.5
+    assert sizes[2][1] < 0.9
+
+
+class FakeAssigner:
+    """assign_records without an index: fails on records without lat."""
+
+    def assign_records(self, records):
+        for record in records:
+            if "lat" not in record:
+                raise ValueError("Missing required column: lat")
+        return [dict(record, barangay_psgc=1) for record in records]
+
+    def stats(self):
+        return {}
+
+
+def test_bad_lines_do_not_stop_line_mode(monkeypatch, capsys):
+    """Invalid JSON and unassignable records give error lines only."""
+
+    stdin = io.StringIO(
+        '{"lat": 14.0, "long": 121.0}\n'
+        'not json\n'
+        '{"long": 121.0}\n'
+        '{"lat": 15.0, "long": 120.0}\n'
+    )
+    monkeypatch.setattr(sys, "stdin", stdin)
+
+    serve_lines(FakeAssigner(), batch_size=256, max_wait=0.05)
+
+    out = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+    assert [r["lat"] for r in out if "error" not in r] == [14.0, 15.0]
+    assert sum("error" in r for r in out) == 2